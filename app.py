@@ -1,8 +1,14 @@
 # app.py
 
 import streamlit as st
-import pandas as pd
-from io import BytesIO
+from core.cache_disco import hash_conteudo
+from core.consolidacao import arquivos_por_unidade, carregar_varias, consolidar, nome_unidade_sugerido, unidades_reais
+from core.dados import GRUPOS, ler_excel
+from core.kpis import SECOES_HISTORICAS, SECOES_MENSAIS, LayoutInvalido, formatar_kpi as format_kpi
+from core.instrumentacao import anotar, secao
+from core.registro import REGISTRO
+from core.ui import (gravar_historico, medir_fragmento, medir_pagina, mostrar_avisos_historico,
+                     mostrar_progresso_precalculo, selecionar_unidade)
 
 # --- CONFIGURAÇÃO DA PÁGINA ---
 st.set_page_config(
@@ -10,162 +16,199 @@ st.set_page_config(
     page_icon="💰",
     layout="wide"
 )
-
-# --- FUNÇÃO DE CACHE PARA CARREGAR DADOS ---
-@st.cache_data
-def load_data(file_content):
-    try:
-        df = pd.read_excel(BytesIO(file_content), header=0, index_col=0)
-        for col in df.columns:
-            df[col] = pd.to_numeric(df[col].astype(str).str.replace(',', '.'), errors='coerce')
-        df.dropna(how='all', axis=0, inplace=True)
-        df.dropna(how='all', axis=1, inplace=True)
-        grupos = {
-            'CMV': (1, 9), 'Folha': (10, 28), 'Folha Retorno': (29, 39),
-            'Despesas Gerais': (40, 64), 'Estoques': (65, 68), 'Descontos': (69, 80),
-            'Compras e Ineficiência': (81, 83)
-        }
-        return df, grupos
-    except Exception as e:
-        st.error(f"Erro ao ler o arquivo: {e}")
-        return None, None
-
-# --- SIDEBAR E UPLOAD PERSISTENTE ---
-with st.sidebar:
-    st.image("https://streamlit.io/images/brand/streamlit-logo-secondary-colormark-darktext.png", width=200)
-    st.title("Menu de Navegação")
-    if 'file_content' not in st.session_state:
-        st.session_state.file_content = None
-
-    uploaded_file = st.file_uploader("Faça o upload do seu arquivo Excel", type=["xlsx", "xls"])
-    if uploaded_file is not None:
-        st.session_state.file_content = uploaded_file.getvalue()
-        st.session_state.file_name = uploaded_file.name
-
-    if st.session_state.file_content is not None:
-        st.success(f"Arquivo `{st.session_state.get('file_name', '...')} ` carregado.")
-        if st.button("Remover arquivo"):
-            st.session_state.file_content = None
-            st.session_state.file_name = None
-            st.rerun()
-
-# --- PÁGINA PRINCIPAL ---
-st.title("🚀 Dashboard de Análise Financeira")
-
-if st.session_state.file_content is not None:
-    df, grupos = load_data(st.session_state.file_content)
-    if df is not None:
-        st.session_state.df, st.session_state.grupos, st.session_state.months = df, grupos, df.columns.tolist()
-
-        # --- FILTRO DE MÊS NA PÁGINA PRINCIPAL ---
-        st.markdown("---")
-        months_list = st.session_state.months
-        _, col_filter, _ = st.columns([2, 3, 2])
-        with col_filter:
-            focus_month = st.selectbox(
-                "🗓️ **Selecione o Mês de Análise**",
-                options=months_list,
-                index=len(months_list) - 1
-            )
-        st.markdown("---")
-
-        focus_month_index = months_list.index(focus_month)
-        previous_month = months_list[focus_month_index - 1] if focus_month_index > 0 else None
-        df_historical = df.iloc[:, :focus_month_index] if focus_month_index > 0 else None
-
-        cat = {
-            'cmv_geral': df.index[6], 'cmv_ab': df.index[7], 'inef_perc': df.index[8],
-            'inef_rs': df.index[9], 'compras': df.index[81], 'inef_compra_perc': df.index[82],
-            'inef_compra_rs': df.index[83], 'desp_folha': df.index[39], 'desp_geral': df.index[64],
-            'descontos': df.index[80]
-        }
-        def format_value(value, is_percent=False):
-            if not isinstance(value, (int, float)) or pd.isna(value): return "N/A"
-            if is_percent: return f"{value:.2%}"
-            return f"{value:,.2f}"
-
-        # --- ANÁLISE MENSAL COM KPIs RESTAURADOS ---
-        if previous_month:
-            st.header("📊 KPIs Principais (Resumo Geral)")
-            st.subheader(f"Análise de {focus_month} (Comparativo com {previous_month})")
-            col1, col2, col3, col4 = st.columns(4)
-
-            with col1: # CMV
-                st.markdown("###### CMV")
-                # CMV Geral
-                valor_focal = df.loc[cat['cmv_geral'], focus_month]
-                valor_anterior = df.loc[cat['cmv_geral'], previous_month]
-                st.metric(f"{cat['cmv_geral']} ({focus_month})", format_value(valor_focal, True), delta=format_value(valor_focal - valor_anterior, True), delta_color="inverse", help=f"Vs. {previous_month}: {format_value(valor_anterior, True)}")
-                # CMV A&B
-                valor_focal = df.loc[cat['cmv_ab'], focus_month]
-                valor_anterior = df.loc[cat['cmv_ab'], previous_month]
-                st.metric(f"{cat['cmv_ab']} ({focus_month})", format_value(valor_focal, True), delta=format_value(valor_focal - valor_anterior, True), delta_color="inverse", help=f"Vs. {previous_month}: {format_value(valor_anterior, True)}")
-
-            with col2: # Ineficiências
-                st.markdown("###### Ineficiências")
-                # Ineficiência %
-                valor_focal = df.loc[cat['inef_perc'], focus_month]
-                valor_anterior = df.loc[cat['inef_perc'], previous_month]
-                st.metric(f"{cat['inef_perc']} ({focus_month})", format_value(valor_focal), delta=format_value(valor_focal - valor_anterior), delta_color="inverse", help=f"Vs. {previous_month}: {format_value(valor_anterior)}")
-                # Ineficiência R$
-                valor_focal = df.loc[cat['inef_rs'], focus_month]
-                valor_anterior = df.loc[cat['inef_rs'], previous_month]
-                st.metric(f"{cat['inef_rs']} ({focus_month})", f"R$ {format_value(valor_focal)}", delta=f"R$ {format_value(valor_focal - valor_anterior)}", delta_color="inverse", help=f"Vs. {previous_month}: R$ {format_value(valor_anterior)}")
-
-            with col3: # Compras e Descontos
-                st.markdown("###### Compras e Descontos")
-                # Compras %
-                valor_focal = df.loc[cat['compras'], focus_month]
-                valor_anterior = df.loc[cat['compras'], previous_month]
-                st.metric(f"{cat['compras']} ({focus_month})", format_value(valor_focal, True), delta=format_value(valor_focal - valor_anterior, True), delta_color="inverse", help=f"Vs. {previous_month}: {format_value(valor_anterior, True)}")
-                # Descontos %
-                valor_focal = df.loc[cat['descontos'], focus_month]
-                valor_anterior = df.loc[cat['descontos'], previous_month]
-                st.metric(f"{cat['descontos']} ({focus_month})", format_value(valor_focal, True), delta=format_value(valor_focal - valor_anterior, True), delta_color="inverse", help=f"Vs. {previous_month}: {format_value(valor_anterior, True)}")
-                 
-            with col4: # Despesas Totais
-                st.markdown("###### Despesas Totais")
-                # Despesa de Folha
-                valor_focal = df.loc[cat['desp_folha'], focus_month]
-                valor_anterior = df.loc[cat['desp_folha'], previous_month]
-                st.metric(f"{cat['desp_folha']} ({focus_month})", format_value(valor_focal, True), delta=format_value(valor_focal - valor_anterior, True), delta_color="inverse", help=f"Vs. {previous_month}: {format_value(valor_anterior, True)}")
-                # Despesas Gerais
-                valor_focal = df.loc[cat['desp_geral'], focus_month]
-                valor_anterior = df.loc[cat['desp_geral'], previous_month]
-                st.metric(f"{cat['desp_geral']} ({focus_month})", format_value(valor_focal, True), delta=format_value(valor_focal - valor_anterior, True), delta_color="inverse", help=f"Vs. {previous_month}: {format_value(valor_anterior, True)}")
-        else:
-            st.info(f"Analisando {focus_month}. Não há mês anterior para comparação mensal.")
-
-        # --- ANÁLISE HISTÓRICA COMPLETA E DINÂMICA ---
-        if df_historical is not None and not df_historical.empty:
-            st.markdown("<br>", unsafe_allow_html=True)
-            st.subheader(f"Análise Histórica ({focus_month} vs. Média até {previous_month})")
-            col1_hist, col2_hist, col3_hist, _ = st.columns(4)
-
-            with col1_hist:
-                st.markdown("###### CMV")
-                # CMV Geral
-                media_hist = df_historical.loc[cat['cmv_geral']].mean()
-                valor_focal = df.loc[cat['cmv_geral'], focus_month]
-                st.metric(f"Média Hist. {cat['cmv_geral']}", format_value(media_hist, True), delta=format_value(valor_focal - media_hist, True), delta_color="inverse", help=f"Valor de {focus_month}: {format_value(valor_focal, True)}")
-            
-            with col2_hist:
-                 # CMV A&B
-                st.markdown("######  ", unsafe_allow_html=True) # Espaçador
-                media_hist = df_historical.loc[cat['cmv_ab']].mean()
-                valor_focal = df.loc[cat['cmv_ab'], focus_month]
-                st.metric(f"Média Hist. {cat['cmv_ab']}", format_value(media_hist, True), delta=format_value(valor_focal - media_hist, True), delta_color="inverse", help=f"Valor de {focus_month}: {format_value(valor_focal, True)}")
-
-            with col3_hist:
-                st.markdown("###### Ineficiência Compra R$")
-                media_hist = df_historical.loc[cat['inef_compra_rs']].mean()
-                valor_focal = df.loc[cat['inef_compra_rs'], focus_month]
-                st.metric(f"Média Hist. {cat['inef_compra_rs']}", f"R$ {format_value(media_hist)}", delta=f"R$ {format_value(valor_focal - media_hist)}", delta_color="inverse", help=f"Valor de {focus_month}: R$ {format_value(valor_focal)}")
-        
-        # --- PRE-VISUALIZAÇÃO DOS DADOS ---
-        st.markdown("---")
-        st.subheader("Pré-visualização dos Dados Carregados")
-        st.dataframe(df.style.format("{:,.2f}", na_rep="-"))
-else:
-    st.markdown("### Bem-vindo! Faça o upload do seu arquivo no menu à esquerda para começar.")
-    st.info("Aguardando o upload de um arquivo Excel.")
\ No newline at end of file
+# Tempos por seção: ligados com DASHPL_METRICAS ou ?metricas=painel,log,perfil na URL
+with medir_pagina("app"):
+
+    # --- FUNÇÃO PARA CARREGAR DADOS ---
+    # As planilhas (uma por unidade) são lidas em paralelo e empilhadas em um
+    # único DataFrame com índice (unidade, conta). O resultado fica no registro
+    # do processo, compartilhado por todas as sessões que abrirem o mesmo conteúdo.
+    def load_data(arquivos):
+        try:
+            dfs = carregar_varias(arquivos)
+            anotar(cache_disco=f"{sum(d.attrs.get('origem') == 'cache_disco' for d in dfs.values())}/{len(dfs)}")
+            df = consolidar(dfs)
+            return df, GRUPOS
+        except Exception as e:
+            st.error(f"Erro ao ler o arquivo: {e}")
+            return None, None
+
+    # --- SIDEBAR E UPLOAD PERSISTENTE ---
+    with st.sidebar:
+        st.image("https://streamlit.io/images/brand/streamlit-logo-secondary-colormark-darktext.png", width=200)
+        st.title("Menu de Navegação")
+        if 'dataset' not in st.session_state:
+            st.session_state.dataset = None
+
+        uploaded_files = st.file_uploader("Faça o upload dos seus arquivos Excel (um por unidade)", type=["xlsx", "xls"], accept_multiple_files=True)
+        # O nome da unidade identifica a planilha no histórico: as planilhas de anos
+        # diferentes da mesma unidade precisam do mesmo nome para o comparativo anual,
+        # e são juntadas em uma unidade só no dataset (carregar_varias)
+        unidades_arquivos = []
+        if uploaded_files:
+            with st.expander("🏷️ Nomes das unidades"):
+                st.caption("Arquivos com o mesmo nome (ex.: um por ano) são juntados em uma unidade só.")
+                for f in uploaded_files:
+                    sugerido = nome_unidade_sugerido(f.name)
+                    nome = st.text_input(f"Unidade de `{f.name}`", value=sugerido, key=f"unidade_arquivo_{f.file_id}")
+                    unidades_arquivos.append(nome.strip() or sugerido)
+        file_ids = (tuple(f.file_id for f in uploaded_files), tuple(unidades_arquivos))
+        if uploaded_files and file_ids != st.session_state.get('file_ids'):
+            arquivos = arquivos_por_unidade([(f.name, f.getvalue()) for f in uploaded_files], unidades_arquivos)
+            st.session_state.file_ids = file_ids
+            st.session_state.file_name = ", ".join(f.name for f in uploaded_files)
+            st.session_state.file_hash = hash_conteudo("".join(u + hash_conteudo(c) for u, c in arquivos).encode())
+
+            # A sessão guarda só o handle; os bytes e o DataFrame ficam no registro compartilhado
+            with secao("load_data"):
+                dataset = REGISTRO.adquirir(st.session_state.file_hash)
+                anotar(registro='hit' if dataset is not None else 'miss')
+                if dataset is None:
+                    df_novo, _ = load_data(arquivos)
+                    if df_novo is not None:
+                        dataset = REGISTRO.registrar(st.session_state.file_hash, df_novo)
+            if dataset is not None:
+                dataset.precalcular(GRUPOS)
+                # Todo dataset carregado entra no histórico local (comparativos entre anos), em segundo plano
+                gravar_historico(dataset.df, dataset.chave, st.session_state.file_name, nova_lista=True)
+            st.session_state.dataset = dataset
+            del arquivos
+
+        if st.session_state.dataset is not None:
+            st.success(f"Arquivo(s) `{st.session_state.get('file_name', '...')} ` carregado(s).")
+            if st.button("Remover arquivo"):
+                st.session_state.dataset = None
+                st.session_state.file_name = None
+                for chave in ('df', 'indice', 'gravacoes_historico'):
+                    st.session_state.pop(chave, None)
+                st.rerun()
+
+        # --- INCLUSÃO DE UM NOVO MÊS SEM REENVIAR O HISTÓRICO ---
+        if st.session_state.dataset is not None:
+            with st.expander("➕ Adicionar mês"):
+                st.caption("Envie só a(s) coluna(s) do(s) novo(s) mês(es), com as contas na primeira coluna.")
+                unidades_existentes = unidades_reais(st.session_state.dataset.df)
+                unidade_destino = unidades_existentes[0]
+                if len(unidades_existentes) > 1:
+                    unidade_destino = st.selectbox("Unidade", unidades_existentes, key="unidade_novo_mes")
+                arquivo_mes = st.file_uploader("Planilha do novo mês", type=["xlsx", "xls"], key="upload_novo_mes")
+                if arquivo_mes is not None and st.button("Adicionar ao dataset"):
+                    conteudo = arquivo_mes.getvalue()
+                    try:
+                        novos = ler_excel(conteudo)
+                        dataset = st.session_state.dataset.anexar_meses(unidade_destino, novos, hash_conteudo(conteudo))
+                    except Exception as e:
+                        st.error(f"Erro ao adicionar o mês: {e}")
+                    else:
+                        dataset.precalcular(GRUPOS)
+                        # Só os meses novos da unidade vão para o histórico; o resto já está lá
+                        meses_novos = dataset.df.loc[[unidade_destino], list(novos.columns)]
+                        gravar_historico(meses_novos, dataset.chave, arquivo_mes.name)
+                        st.session_state.dataset = dataset
+                        st.session_state.file_hash = dataset.chave
+                        st.session_state.file_name = f"{st.session_state.file_name} + {arquivo_mes.name}"
+                        st.success(f"{novos.shape[1]} mês(es) adicionado(s) a {unidade_destino}.")
+
+        # Depois do "Adicionar mês", para já incluir a gravação dele
+        if st.session_state.dataset is not None:
+            mostrar_avisos_historico()
+
+    # --- PÁGINA PRINCIPAL ---
+    st.title("🚀 Dashboard de Análise Financeira")
+
+    if st.session_state.dataset is not None:
+        df_consolidado = st.session_state.dataset.df
+        st.session_state.grupos = GRUPOS
+        invalidas = {u: n for u, n in df_consolidado.attrs.get('celulas_invalidas', {}).items() if n}
+        if invalidas:
+            detalhe = ", ".join(f"{u}: {n}" for u, n in invalidas.items())
+            st.warning(f"{sum(invalidas.values())} célula(s) não numéricas foram ignoradas e tratadas como vazias ({detalhe}).")
+        with secao("selecionar_unidade"):
+            df = selecionar_unidade()
+        mostrar_progresso_precalculo()
+        if not df.empty:
+
+            # O mês de análise e os KPIs formam um fragmento: trocar o mês não
+            # reexecuta o restante da página (como a pré-visualização dos dados).
+            @st.fragment
+            @medir_fragmento("kpis")
+            def secao_kpis():
+                # --- FILTRO DE MÊS NA PÁGINA PRINCIPAL ---
+                st.markdown("---")
+                months_list = st.session_state.months
+                _, col_filter, _ = st.columns([2, 3, 2])
+                with col_filter:
+                    focus_month = st.selectbox(
+                        "🗓️ **Selecione o Mês de Análise**",
+                        options=months_list,
+                        index=len(months_list) - 1
+                    )
+                st.markdown("---")
+
+                focus_month_index = months_list.index(focus_month)
+                previous_month = months_list[focus_month_index - 1] if focus_month_index > 0 else None
+
+                # KPIs de todos os meses calculados uma vez por unidade; trocar o mês é só uma consulta
+                try:
+                    with secao("painel_kpis"):
+                        painel = st.session_state.dataset.kpis(st.session_state.unidade)
+                except LayoutInvalido as e:
+                    painel = None
+                    st.error(f"Não foi possível calcular os KPIs: {e}")
+
+                if painel is not None:
+                    kpis_mes = painel.mes(focus_month_index)
+
+                    # --- ANÁLISE MENSAL COM KPIs RESTAURADOS ---
+                    if previous_month:
+                        st.header("📊 KPIs Principais (Resumo Geral)")
+                        st.subheader(f"Análise de {focus_month} (Comparativo com {previous_month})")
+                        for coluna, (titulo, chaves) in zip(st.columns(len(SECOES_MENSAIS)), SECOES_MENSAIS):
+                            with coluna:
+                                st.markdown(f"###### {titulo}")
+                                for chave in chaves:
+                                    kpi, formato, rotulo = kpis_mes[chave], painel.formatos[chave], painel.rotulos[chave]
+                                    st.metric(f"{rotulo} ({focus_month})", format_kpi(kpi['valor'], formato), delta=format_kpi(kpi['delta'], formato), delta_color="inverse", help=f"Vs. {previous_month}: {format_kpi(kpi['anterior'], formato)}")
+                    else:
+                        st.info(f"Analisando {focus_month}. Não há mês anterior para comparação mensal.")
+
+                    # --- ANÁLISE HISTÓRICA COMPLETA E DINÂMICA ---
+                    if focus_month_index > 0:
+                        st.markdown("<br>", unsafe_allow_html=True)
+                        st.subheader(f"Análise Histórica ({focus_month} vs. Média até {previous_month})")
+                        for coluna, (titulo, chave) in zip(st.columns(4), SECOES_HISTORICAS):
+                            with coluna:
+                                st.markdown(f"###### {titulo}" if titulo else "######  ", unsafe_allow_html=True)
+                                kpi, formato, rotulo = kpis_mes[chave], painel.formatos[chave], painel.rotulos[chave]
+                                st.metric(f"Média Hist. {rotulo}", format_kpi(kpi['media_historica'], formato), delta=format_kpi(kpi['delta_historico'], formato), delta_color="inverse", help=f"Valor de {focus_month}: {format_kpi(kpi['valor'], formato)}")
+
+            secao_kpis()
+
+            # --- PRE-VISUALIZAÇÃO DOS DADOS ---
+            # Paginada: só as linhas da página atual são formatadas (e ficam em cache) e enviadas ao navegador
+            @st.fragment
+            @medir_fragmento("previa")
+            def secao_previa():
+                st.markdown("---")
+                st.subheader("Pré-visualização dos Dados Carregados")
+                previa = st.session_state.dataset.previa(st.session_state.unidade)
+                col_busca, col_grupo, col_tamanho = st.columns([3, 2, 1])
+                with col_busca:
+                    termo = st.text_input("🔎 Buscar conta", key="previa_busca")
+                with col_grupo:
+                    grupo = st.selectbox("Grupo", ["Todos"] + list(GRUPOS.keys()), key="previa_grupo")
+                with col_tamanho:
+                    tamanho = st.selectbox("Linhas", [25, 50, 100], key="previa_tamanho")
+
+                posicoes = previa.filtrar(termo, None if grupo == "Todos" else GRUPOS[grupo])
+                n_paginas = previa.n_paginas(posicoes, tamanho)
+                pagina = st.number_input("Página", min_value=1, max_value=n_paginas, value=1, key=f"previa_pagina_{termo}_{grupo}_{tamanho}") - 1
+                with secao("tabela"):
+                    st.dataframe(previa.janela(posicoes, pagina, tamanho), use_container_width=True)
+                inicio = pagina * tamanho
+                st.caption(f"Linhas {min(inicio + 1, len(posicoes))}–{min(inicio + tamanho, len(posicoes))} de {len(posicoes)} (página {pagina + 1} de {n_paginas}).")
+
+            secao_previa()
+    else:
+        st.markdown("### Bem-vindo! Faça o upload do seu arquivo no menu à esquerda para começar.")
+        st.info("Aguardando o upload de um arquivo Excel.")
@@ -0,0 +1,2 @@
+# benchmarks/__init__.py
+# Medições de desempenho (não são testes): python -m benchmarks.executar --help
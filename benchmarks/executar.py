@@ -0,0 +1,256 @@
+# benchmarks/executar.py
+"""Mede tempo e pico de memória dos cálculos do dashboard em planilhas sintéticas.
+
+Uso (na raiz do repositório):
+    python -m benchmarks.executar --contas 500 --meses 60 --unidades 4 --nan 0.1
+    python -m benchmarks.executar --comparar benchmarks/resultados/<commit>.json
+
+Os resultados são gravados em benchmarks/resultados/<commit>.json junto com os
+parâmetros, para comparar commits com a mesma carga. Com --comparar, o comando
+termina com código 1 se algum cenário ficar mais lento que a tolerância.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.planilha_sintetica import gerar_unidades
+from core import cache_disco
+from core.consolidacao import carregar_varias, consolidar, unidades_reais, visao_unidade
+from core.dados import GRUPOS
+from core.diagnostico import calcular_analise
+from core.graficos import reduzir_mapa_calor
+from core.indice_periodo import IndicePeriodo
+from core.kpis import PainelKpis, formatar_kpi
+from core.tendencia import calcular_tendencia
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASTA_RESULTADOS = os.path.join(RAIZ, "benchmarks", "resultados")
+
+
+# --- CENÁRIOS ---
+# Cada cenário recebe o contexto e retorna (preparo, execução) ou (preparo,
+# execução, execução para o pico de memória): o preparo roda antes de cada
+# repetição e fica fora da medição.
+def _limpar_cache():
+    shutil.rmtree(cache_disco.CACHE_DIR, ignore_errors=True)
+
+
+def _load_data(ctx, max_workers=None):
+    return lambda: consolidar(carregar_varias(ctx['arquivos'], max_workers=max_workers))
+
+
+def cenario_load_data_frio(ctx):
+    # O pico de memória é medido com a leitura no próprio processo (max_workers=1):
+    # o tracemalloc não enxerga o que os processos de leitura alocam
+    return _limpar_cache, _load_data(ctx), _load_data(ctx, max_workers=1)
+
+
+def cenario_load_data_cache(ctx):
+    _load_data(ctx)()  # garante o cache preenchido
+    return None, _load_data(ctx)
+
+
+def cenario_kpis(ctx):
+    # Bloco de KPIs do app.py: painel de todos os meses e a consulta/formatação de cada mês
+    df = ctx['df']
+
+    def executar():
+        painel = PainelKpis(df)
+        for i in range(len(painel.months)):
+            for chave, kpi in painel.mes(i).items():
+                formatar_kpi(kpi['valor'], painel.formatos[chave])
+                formatar_kpi(kpi['media_historica'], painel.formatos[chave])
+    return None, executar
+
+
+def cenario_indice_periodo(ctx):
+    return None, lambda: IndicePeriodo(ctx['df'])
+
+
+def cenario_pagina1_ranking_volatilidade(ctx):
+    # Página 1: estatísticas do período e os rankings de média e desvio de cada grupo
+    indice = ctx['indice']
+    fim = ctx['df'].shape[1] - 1
+
+    def executar():
+        stats = indice.estatisticas(0, fim)
+        for inicio_g, fim_g in GRUPOS.values():
+            stats['media'].iloc[inicio_g:fim_g + 1].sort_values(ascending=False).head(15)
+            stats['desvio'].iloc[inicio_g:fim_g + 1].sort_values(ascending=False).head(10)
+    return None, executar
+
+
+def cenario_pagina1_mapa_calor(ctx):
+    df = ctx['df']
+
+    def executar():
+        for inicio_g, fim_g in GRUPOS.values():
+            bloco = df.iloc[inicio_g:fim_g + 1]
+            reduzir_mapa_calor(bloco.loc[bloco.sum(axis=1) != 0])
+    return None, executar
+
+
+def cenario_pagina3_analise(ctx):
+    # Página 3: analise_df de cada grupo no histórico completo
+    df, indice = ctx['df'], ctx['indice']
+    fim = df.shape[1] - 1
+
+    def executar():
+        for faixa in GRUPOS.values():
+            calcular_analise(df, indice, faixa, 0, fim)
+    return None, executar
+
+
+def cenario_calcular_tendencia(ctx):
+    return None, lambda: calcular_tendencia(ctx['df'])
+
+
+CENARIOS = {
+    'load_data_frio': cenario_load_data_frio,
+    'load_data_cache': cenario_load_data_cache,
+    'kpis': cenario_kpis,
+    'indice_periodo': cenario_indice_periodo,
+    'pagina1_ranking_volatilidade': cenario_pagina1_ranking_volatilidade,
+    'pagina1_mapa_calor': cenario_pagina1_mapa_calor,
+    'pagina3_analise': cenario_pagina3_analise,
+    'calcular_tendencia': cenario_calcular_tendencia,
+}
+
+
+# --- MEDIÇÃO ---
+def medir(preparo, executar, repeticoes, executar_pico=None):
+    """Tempos (s) de `repeticoes` execuções após um aquecimento, e o pico de memória (MB).
+
+    O pico é medido com tracemalloc numa execução à parte (com `executar_pico`,
+    se informado), para não distorcer os tempos.
+    """
+    if preparo: preparo()
+    executar()
+    tempos = []
+    for _ in range(repeticoes):
+        if preparo: preparo()
+        inicio = time.perf_counter()
+        executar()
+        tempos.append(time.perf_counter() - inicio)
+
+    if preparo: preparo()
+    tracemalloc.start()
+    try:
+        (executar_pico or executar)()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return tempos, pico / 1024 ** 2
+
+
+def _commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True, text=True, check=True).stdout.strip()
+        sujo = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=RAIZ, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "desconhecido"
+    return commit + ("-modificado" if sujo else "")
+
+
+def executar_cenarios(parametros, nomes, repeticoes):
+    arquivos = gerar_unidades(parametros['unidades'], n_contas=parametros['contas'], n_meses=parametros['meses'],
+                              densidade_nan=parametros['nan'], semente=parametros['semente'], texto_br=parametros['texto_br'])
+    df_consolidado = consolidar(carregar_varias(arquivos))
+    df = visao_unidade(df_consolidado, unidades_reais(df_consolidado)[0])
+    ctx = {'arquivos': arquivos, 'df': df, 'indice': IndicePeriodo(df)}
+
+    resultados = {}
+    for nome in nomes:
+        preparo, executar, *pico = CENARIOS[nome](ctx)
+        tempos, pico_mb = medir(preparo, executar, repeticoes, *pico)
+        resultados[nome] = {
+            'mediana_s': float(np.median(tempos)),
+            'minimo_s': float(np.min(tempos)),
+            'pico_mb': round(pico_mb, 3),
+            'repeticoes': repeticoes,
+        }
+        print(f"{nome:<32} mediana {resultados[nome]['mediana_s'] * 1000:10.2f} ms   "
+              f"mín {resultados[nome]['minimo_s'] * 1000:10.2f} ms   pico {pico_mb:9.2f} MB", flush=True)
+    return resultados
+
+
+def comparar(atual, base, tolerancia):
+    """Imprime a razão atual/base de cada cenário e retorna os que ficaram mais lentos que a tolerância."""
+    if atual['parametros'] != base['parametros']:
+        print(f"Aviso: parâmetros diferentes da base ({base['parametros']}); a comparação não é direta.")
+    regressoes = []
+    print(f"\nComparação com {base['commit']}:")
+    for nome, r in atual['resultados'].items():
+        b = base['resultados'].get(nome)
+        if b is None:
+            continue
+        razao = r['mediana_s'] / b['mediana_s'] if b['mediana_s'] else float('inf')
+        marca = "  <-- REGRESSÃO" if razao > 1 + tolerancia else ""
+        print(f"{nome:<32} {razao:6.2f}x tempo   {r['pico_mb'] - b['pico_mb']:+9.2f} MB{marca}")
+        if marca:
+            regressoes.append(nome)
+    return regressoes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks dos cálculos do dashboard em planilhas sintéticas.")
+    parser.add_argument("--contas", type=int, default=90, help="Contas (linhas) por planilha; mínimo de 84 pelo layout dos grupos")
+    parser.add_argument("--meses", type=int, default=36)
+    parser.add_argument("--unidades", type=int, default=2)
+    parser.add_argument("--nan", type=float, default=0.05, help="Fração de células vazias")
+    parser.add_argument("--texto-br", action="store_true", help="Grava os valores como texto no formato brasileiro")
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--cenarios", nargs="+", choices=list(CENARIOS), default=list(CENARIOS))
+    parser.add_argument("--saida", help="Arquivo JSON dos resultados (padrão: benchmarks/resultados/<commit>.json)")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior para comparar")
+    parser.add_argument("--tolerancia", type=float, default=0.10, help="Aumento de tempo aceito na comparação (padrão: 0.10 = 10%%)")
+    args = parser.parse_args(argv)
+
+    parametros = {'contas': args.contas, 'meses': args.meses, 'unidades': args.unidades,
+                  'nan': args.nan, 'texto_br': args.texto_br, 'semente': args.semente}
+    commit = _commit()
+    # O cache em disco do load_data vai para uma pasta temporária; a variável de
+    # ambiente vale também para os processos de leitura paralela, criados depois
+    pasta_cache = tempfile.mkdtemp(prefix="dashpl_bench_")
+    os.environ["DASHPL_CACHE_DIR"] = cache_disco.CACHE_DIR = pasta_cache
+    try:
+        resultados = executar_cenarios(parametros, args.cenarios, args.repeticoes)
+    finally:
+        shutil.rmtree(pasta_cache, ignore_errors=True)
+
+    atual = {
+        'commit': commit,
+        'data': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'ambiente': {'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+                     'maquina': platform.machine(), 'cpus': os.cpu_count()},
+        'parametros': parametros,
+        'resultados': resultados,
+    }
+    saida = args.saida or os.path.join(PASTA_RESULTADOS, f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(saida)), exist_ok=True)
+    with open(saida, "w", encoding="utf-8") as f:
+        json.dump(atual, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados gravados em {saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            base = json.load(f)
+        if comparar(atual, base, args.tolerancia):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
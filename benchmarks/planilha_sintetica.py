@@ -0,0 +1,74 @@
+# benchmarks/planilha_sintetica.py
+
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from core.dados import GRUPOS
+from core.kpis import KPIS
+
+
+def _rotulos(n_contas, grupos):
+    # Contas dos KPIs com o trecho esperado pelo PainelKpis; as demais nomeadas pelo grupo
+    rotulos = [f"Conta {i}" for i in range(n_contas)]
+    rotulos[0] = "Faturamento"
+    for grupo, (inicio, fim) in grupos.items():
+        for i in range(inicio, min(fim + 1, n_contas)):
+            rotulos[i] = f"{grupo} {i - inicio + 1}"
+    for chave, (linha, _, _) in KPIS.items():
+        if linha < n_contas:
+            rotulos[linha] = chave.replace('_', ' ').title()
+    return rotulos
+
+
+def gerar_df(n_contas=90, n_meses=24, densidade_nan=0.0, semente=0, grupos=GRUPOS):
+    """DataFrame no layout de `grupos` (uma conta por linha, um mês por coluna).
+
+    As linhas dos KPIs percentuais recebem frações; as demais, valores em reais
+    com tendência e sazonalidade. Uma fração `densidade_nan` das células fica
+    vazia, sem nunca esvaziar uma linha inteira (o load_data descartaria a linha
+    e deslocaria o layout).
+    """
+    ultima_linha = max(fim for _, fim in grupos.values())
+    if n_contas <= ultima_linha:
+        raise ValueError(f"São necessárias pelo menos {ultima_linha + 1} contas para o layout dos grupos.")
+
+    rng = np.random.default_rng(semente)
+    meses = pd.period_range("2015-01", periods=n_meses, freq="M").strftime("%Y-%m").tolist()
+    t = np.arange(n_meses)
+    nivel = rng.uniform(1_000, 100_000, (n_contas, 1))
+    tendencia = rng.normal(0, 0.01, (n_contas, 1)) * nivel
+    sazonal = rng.uniform(0, 0.1, (n_contas, 1)) * nivel * np.sin(2 * np.pi * t / 12)
+    valores = nivel + tendencia * t + sazonal + rng.normal(0, 0.05, (n_contas, n_meses)) * nivel
+
+    percentuais = [linha for linha, formato, _ in KPIS.values() if formato == 'percent' and linha < n_contas]
+    valores[percentuais] = rng.uniform(0.05, 0.6, (len(percentuais), n_meses))
+
+    if densidade_nan > 0:
+        vazias = rng.random((n_contas, n_meses)) < densidade_nan
+        vazias[np.arange(n_contas), rng.integers(0, n_meses, n_contas)] = False
+        valores[vazias] = np.nan
+
+    return pd.DataFrame(valores.round(2), index=_rotulos(n_contas, grupos), columns=meses)
+
+
+def gerar_planilha(n_contas=90, n_meses=24, densidade_nan=0.0, semente=0, texto_br=False, grupos=GRUPOS):
+    """Conteúdo (bytes) de um .xlsx sintético, como o que é enviado no upload.
+
+    Com `texto_br` os valores são gravados como texto no formato brasileiro
+    ("1.234,56"), o caminho mais caro da conversão numérica.
+    """
+    df = gerar_df(n_contas, n_meses, densidade_nan, semente, grupos)
+    if texto_br:
+        df = df.apply(lambda coluna: coluna.map(
+            lambda v: "" if pd.isna(v) else f"{v:,.2f}".replace(",", "_").replace(".", ",").replace("_", ".")))
+    buffer = BytesIO()
+    df.to_excel(buffer, index_label="Conta")
+    return buffer.getvalue()
+
+
+def gerar_unidades(n_unidades=1, **parametros):
+    """Lista de pares (unidade, bytes) no formato recebido por carregar_varias."""
+    semente = parametros.pop('semente', 0)
+    return [(f"Unidade {i + 1}", gerar_planilha(semente=semente + i, **parametros)) for i in range(n_unidades)]
@@ -0,0 +1,2 @@
+# core/__init__.py
+# Rotinas de cálculo compartilhadas entre o app principal e as páginas.
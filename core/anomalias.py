@@ -0,0 +1,113 @@
+# core/anomalias.py
+
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from core.tendencia import ajustar_tendencias
+
+# Limiares a partir dos quais cada critério é considerado anômalo
+LIMIAR_Z = 3.0
+LIMIAR_MAD = 3.5
+LIMIAR_SALTO = 0.5
+LIMIAR_QUEBRA = 1.0
+
+
+def _posicoes(df):
+    # Posição de cada linha dentro da sua planilha (os grupos são definidos por posição)
+    if isinstance(df.index, pd.MultiIndex) and 'unidade' in df.index.names:
+        return df.groupby(level='unidade', sort=False).cumcount().to_numpy()
+    return np.arange(len(df))
+
+
+def _z_movel(valores, janela):
+    # z de cada mês em relação aos `janela` meses anteriores, via somas acumuladas
+    validos = ~np.isnan(valores)
+    x = np.where(validos, valores, 0.0)
+    zeros = np.zeros((len(valores), 1))
+    soma = np.hstack([zeros, np.cumsum(x, axis=1)])
+    soma_quad = np.hstack([zeros, np.cumsum(x * x, axis=1)])
+    cont = np.hstack([zeros, np.cumsum(validos, axis=1)])
+
+    fim = np.arange(valores.shape[1])
+    ini = np.maximum(fim - janela, 0)
+    n = cont[:, fim] - cont[:, ini]
+    s = soma[:, fim] - soma[:, ini]
+    sq = soma_quad[:, fim] - soma_quad[:, ini]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        media = s / n
+        desvio = np.sqrt(np.clip((sq - s * media) / (n - 1), 0.0, None))
+        z = (valores - media) / desvio
+    z[(n < 3) | ~(desvio > 0)] = np.nan
+    return z
+
+
+# --- MOTOR DE DETECÇÃO DE ANOMALIAS ---
+def detectar_anomalias(df, grupos, janela=6):
+    """Pontua todas as contas dos `grupos` de uma vez e ordena das piores para as melhores.
+
+    Critérios, avaliados no último mês de `df`:
+    - z_movel: desvios padrão em relação aos `janela` meses anteriores;
+    - z_robusto: z modificado pela mediana e MAD de todo o período;
+    - variacao_mensal: variação relativa em relação ao mês anterior;
+    - quebra_tendencia: mudança de inclinação dos últimos `janela` meses em
+      relação aos anteriores, em desvios padrão da conta por mês.
+    `pontuacao` é o maior critério dividido pelo seu limiar (acima de 1 = anomalia).
+    `df` pode ter índice (unidade, conta); nesse caso os grupos valem por unidade.
+    """
+    posicoes = _posicoes(df)
+    rotulos_grupo = np.full(len(df), None, dtype=object)
+    for grupo, (inicio, fim) in grupos.items():
+        rotulos_grupo[(posicoes >= inicio) & (posicoes <= fim)] = grupo
+    nos_grupos = rotulos_grupo != None  # noqa: E711 (comparação elemento a elemento)
+
+    df = df[nos_grupos]
+    rotulos_grupo = rotulos_grupo[nos_grupos]
+    valores = df.to_numpy(dtype=float)
+    n_meses = valores.shape[1]
+    ultimo = valores[:, -1] if n_meses else np.full(len(df), np.nan)
+
+    z_movel = _z_movel(valores, janela)[:, -1] if n_meses else ultimo
+
+    # Linhas inteiras sem dados geram avisos de "All-NaN slice"; o resultado (NaN) é o esperado
+    with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        mediana = np.nanmedian(valores, axis=1)
+        mad = np.nanmedian(np.abs(valores - mediana[:, None]), axis=1)
+        z_robusto = np.where(mad > 0, 0.6745 * (ultimo - mediana) / mad, np.nan)
+
+        anterior = valores[:, -2] if n_meses >= 2 else np.full(len(df), np.nan)
+        variacao_mensal = np.where(anterior != 0, (ultimo - anterior) / np.abs(anterior), np.nan)
+
+        recentes = df.iloc[:, -janela:]
+        antigos = df.iloc[:, :-janela]
+        if antigos.shape[1] >= 2:
+            desvio = np.nanstd(valores, axis=1, ddof=1)
+            delta = ajustar_tendencias(recentes)['inclinacao'].to_numpy() - ajustar_tendencias(antigos)['inclinacao'].to_numpy()
+            quebra_tendencia = np.where(desvio > 0, delta / desvio, np.nan)
+        else:
+            quebra_tendencia = np.full(len(df), np.nan)
+
+    criterios = np.column_stack([
+        np.abs(z_movel) / LIMIAR_Z,
+        np.abs(z_robusto) / LIMIAR_MAD,
+        np.abs(variacao_mensal) / LIMIAR_SALTO,
+        np.abs(quebra_tendencia) / LIMIAR_QUEBRA,
+    ])
+    nomes = np.array(['Desvio da média móvel', 'Outlier (MAD)', 'Salto mensal', 'Quebra de tendência'])
+    sem_dados = np.all(np.isnan(criterios), axis=1)
+    pontuacao = np.where(sem_dados, 0.0, np.nanmax(np.where(sem_dados[:, None], 0.0, criterios), axis=1))
+    motivo = np.where(sem_dados, '-', nomes[np.argmax(np.nan_to_num(criterios, nan=-1.0), axis=1)])
+
+    resultado = pd.DataFrame({
+        'grupo': rotulos_grupo,
+        'ultimo_valor': ultimo,
+        'z_movel': z_movel,
+        'z_robusto': z_robusto,
+        'variacao_mensal': variacao_mensal,
+        'quebra_tendencia': quebra_tendencia,
+        'pontuacao': pontuacao,
+        'motivo': motivo,
+    }, index=df.index)
+    return resultado.sort_values('pontuacao', ascending=False, kind='stable')
@@ -0,0 +1,162 @@
+# core/cache_disco.py
+
+import datetime
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# --- CONFIGURAÇÃO DO CACHE EM DISCO ---
+# Cada planilha já processada é gravada como um arquivo Arrow IPC (colunar, sem
+# compressão) nomeado pelo hash do conteúdo. Leituras posteriores do mesmo
+# arquivo são feitas via memory-map, sem reprocessar o Excel.
+CACHE_DIR = os.environ.get(
+    "DASHPL_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".dashpl_cache")
+)
+CACHE_MAX_BYTES = int(float(os.environ.get("DASHPL_CACHE_MAX_MB", "1024")) * 1024 * 1024)
+
+# Incrementar quando as regras de conversão do load_data mudarem,
+# para invalidar as entradas antigas.
+CACHE_VERSAO = "4"
+
+
+def hash_conteudo(file_content):
+    return hashlib.sha256(file_content).hexdigest()
+
+
+def _caminho(chave):
+    return os.path.join(CACHE_DIR, f"{chave}.v{CACHE_VERSAO}.arrow")
+
+
+# --- RÓTULOS ---
+# Os valores vão para o Arrow como um único buffer float64 contíguo (mês a mês),
+# lido de volta sem cópia a partir do memory-map; os rótulos das
+# contas e dos meses vão nos metadados com o tipo de cada um, para voltarem
+# exatamente como o load_data os gerou (datas continuam datas, códigos numéricos
+# continuam números, mesmo misturados com texto).
+def _codificar(rotulo):
+    if rotulo is None:
+        return ['none', None]
+    if isinstance(rotulo, pd.Timestamp):
+        return ['timestamp', rotulo.isoformat()]
+    if isinstance(rotulo, datetime.datetime):
+        return ['datetime', rotulo.isoformat()]
+    if isinstance(rotulo, datetime.date):
+        return ['date', rotulo.isoformat()]
+    if isinstance(rotulo, datetime.time):
+        return ['time', rotulo.isoformat()]
+    if isinstance(rotulo, (bool, np.bool_)):
+        return ['bool', bool(rotulo)]
+    if isinstance(rotulo, (int, np.integer)):
+        return ['int', int(rotulo)]
+    if isinstance(rotulo, (float, np.floating)):
+        return ['float', None if np.isnan(rotulo) else float(rotulo)]
+    return ['str', str(rotulo)]
+
+
+_DECODIFICAR = {
+    'none': lambda v: None,
+    'timestamp': pd.Timestamp,
+    'datetime': datetime.datetime.fromisoformat,
+    'date': datetime.date.fromisoformat,
+    'time': datetime.time.fromisoformat,
+    'bool': bool,
+    'int': int,
+    'float': lambda v: np.nan if v is None else v,
+    'str': str,
+}
+
+
+def _decodificar(codificado):
+    tipo, valor = codificado
+    return _DECODIFICAR[tipo](valor)
+
+
+def ler(chave):
+    """Retorna o DataFrame em cache para `chave`, ou None se não existir.
+
+    Os valores não são copiados: o DataFrame aponta para o arquivo mapeado e é
+    somente leitura (quem precisar alterar deve copiar antes).
+    """
+    caminho = _caminho(chave)
+    if not os.path.exists(caminho):
+        return None
+    try:
+        # Sem `with`: o array devolvido aponta para o mapeamento, que fica aberto enquanto ele existir
+        table = pa.ipc.open_file(pa.memory_map(caminho, "r")).read_all()
+        os.utime(caminho)  # marca como usado recentemente (LRU)
+        meta = json.loads(table.schema.metadata[b'dashpl'])
+        indice = pd.Index([_decodificar(r) for r in meta['indice']], name=_decodificar(meta['nome_indice']))
+        colunas = pd.Index([_decodificar(r) for r in meta['colunas']])
+        bloco = np.empty(0)
+        if len(table) > 0:
+            coluna = table.column('valores').chunk(0)
+            bloco = np.frombuffer(coluna.buffers()[1], dtype=np.float64, count=len(coluna), offset=coluna.offset * 8)
+        # (meses, contas) em memória; o DataFrame usa o mesmo buffer, só transposto
+        df = pd.DataFrame(bloco.reshape(len(colunas), len(indice)).T, index=indice, columns=colunas, copy=False)
+        df.attrs = meta['attrs']
+        return df
+    except (OSError, KeyError, ValueError, pa.ArrowException):
+        return None
+
+
+def gravar(chave, df):
+    """Grava `df` no cache. Falhas de disco não interrompem o carregamento."""
+    tmp = None
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # Arquivo temporário único: as sessões são threads do mesmo processo
+        descritor, tmp = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+        os.close(descritor)
+        valores = df.to_numpy(dtype=np.float64)
+        meta = {
+            'indice': [_codificar(r) for r in df.index],
+            'nome_indice': _codificar(df.index.name),
+            'colunas': [_codificar(c) for c in df.columns],
+            'attrs': df.attrs,
+        }
+        table = pa.table({'valores': np.ascontiguousarray(valores.T).ravel()},
+                         metadata={'dashpl': json.dumps(meta, default=str)})
+        with pa.OSFile(tmp, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp, _caminho(chave))  # atômico: outras réplicas nunca veem arquivo parcial
+        tmp = None
+        _despejar()
+    except (OSError, TypeError, ValueError, pa.ArrowException):
+        pass
+    finally:
+        if tmp is not None:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+
+def _despejar():
+    # Remove as entradas menos usadas até o cache caber no limite configurado
+    entradas = []
+    for nome in os.listdir(CACHE_DIR):
+        if not nome.endswith(".arrow"):
+            continue
+        caminho = os.path.join(CACHE_DIR, nome)
+        try:
+            info = os.stat(caminho)
+        except OSError:
+            continue
+        entradas.append((info.st_mtime, info.st_size, caminho))
+
+    total = sum(tamanho for _, tamanho, _ in entradas)
+    for _, tamanho, caminho in sorted(entradas):
+        if total <= CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(caminho)
+            total -= tamanho
+        except OSError:
+            pass
@@ -0,0 +1,197 @@
+# core/consolidacao.py
+
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from core.cache_disco import hash_conteudo
+from core.dados import ler_e_guardar, planilha_em_cache
+from core.texto import mes_absoluto
+
+# Início dos processos de leitura: nunca fork (o servidor tem várias threads)
+_METODO_PROCESSOS = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+# Rótulos das visões agregadas (todas as unidades juntas)
+CONSOLIDADO_SOMA = "Consolidado (soma)"
+CONSOLIDADO_MEDIA = "Consolidado (média)"
+
+
+# --- LEITURA PARALELA DE VÁRIAS PLANILHAS ---
+def nome_unidade_sugerido(nome_arquivo):
+    """Nome da unidade a partir do nome do arquivo, sem extensão e sem o ano ("Loja A 2024.xlsx" -> "Loja A").
+
+    As planilhas de anos diferentes da mesma unidade ficam com o mesmo nome,
+    que é o que identifica a unidade no histórico local.
+    """
+    base = os.path.splitext(os.path.basename(nome_arquivo))[0]
+    sem_ano = re.sub(r'(?<!\d)(?:19|20)\d{2}(?!\d)', '', base)
+    sem_ano = re.sub(r'\(\s*\)|\[\s*\]', '', sem_ano)
+    sem_ano = re.sub(r'\s{2,}', ' ', sem_ano).strip(' _-.')
+    return sem_ano or base
+
+
+def arquivos_por_unidade(arquivos, unidades=None):
+    """Converte pares (nome do arquivo, conteúdo) em pares (unidade, conteúdo).
+
+    A unidade é o nome em `unidades` (na mesma ordem dos arquivos), quando
+    informado: nomes repetidos são a mesma unidade, e o carregar_varias junta
+    os arquivos dela (ex.: um por ano). Sem `unidades`, é o nome do arquivo sem
+    extensão; nomes repetidos ganham um sufixo "(2)", "(3)"... até ficarem únicos.
+    """
+    if unidades is not None:
+        return [(unidade, conteudo) for unidade, (_, conteudo) in zip(unidades, arquivos)]
+    resultado, usados = [], set()
+    for nome, conteudo in arquivos:
+        base = unidade = os.path.splitext(os.path.basename(nome))[0]
+        sufixo = 2
+        while unidade in usados:
+            unidade = f"{base} ({sufixo})"
+            sufixo += 1
+        usados.add(unidade)
+        resultado.append((unidade, conteudo))
+    return resultado
+
+
+def carregar_varias(arquivos, max_workers=None):
+    """Lê várias planilhas em paralelo, uma por processo.
+
+    `arquivos` é uma lista de pares (unidade, conteúdo em bytes). Cada planilha
+    passa pelas mesmas regras de conversão do load_data (core.dados.carregar_planilha),
+    inclusive o cache em disco. Arquivos com a mesma unidade são juntados em uma
+    planilha só (juntar_planilhas). Retorna um dicionário {unidade: DataFrame},
+    na ordem em que as unidades aparecem.
+
+    O cache é consultado aqui mesmo; só as planilhas que não estão nele vão para
+    o pool. Os processos são criados por forkserver (ou spawn, onde não há
+    forkserver, como no Windows), e não por fork, porque o servidor do
+    Streamlit já tem várias threads rodando (sessões, pré-cálculo). Com uma
+    planilha a ler, ou max_workers=1, a leitura é feita no próprio processo.
+    """
+    chaves = [hash_conteudo(conteudo) for _, conteudo in arquivos]
+    lidos = [planilha_em_cache(chave) for chave in chaves]
+    faltando = [i for i, df in enumerate(lidos) if df is None]
+    if len(faltando) == 1 or max_workers == 1:
+        for i in faltando:
+            lidos[i] = ler_e_guardar(arquivos[i][1], chaves[i])
+    elif faltando:
+        max_workers = max_workers or min(len(faltando), os.cpu_count() or 1)
+        contexto = multiprocessing.get_context(_METODO_PROCESSOS)
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=contexto) as pool:
+            novos = pool.map(ler_e_guardar, [arquivos[i][1] for i in faltando], [chaves[i] for i in faltando])
+            for i, df in zip(faltando, novos):
+                lidos[i] = df
+
+    por_unidade = {}
+    for (unidade, _), df in zip(arquivos, lidos):
+        por_unidade.setdefault(unidade, []).append(df)
+    return {unidade: juntar_planilhas(dfs) for unidade, dfs in por_unidade.items()}
+
+
+def juntar_planilhas(dfs):
+    """Junta as planilhas de uma mesma unidade (ex.: uma por ano) em uma só, com os meses de todas.
+
+    A planilha que vai até o mês mais recente dá o layout das contas; as outras
+    são alinhadas a ela como no "Adicionar mês" (alinhar_contas). Um mês que
+    aparece em mais de uma planilha fica com o valor da mais recente, a mesma
+    regra do histórico local. Os meses ficam em ordem cronológica quando todos
+    os rótulos são reconhecidos; senão, na ordem das planilhas (da mais antiga).
+    """
+    if len(dfs) == 1:
+        return dfs[0]
+
+    def ultimo_mes(df):
+        return max((m for m in map(mes_absoluto, df.columns) if m is not None), default=-1)
+
+    # Ordem estável da mais antiga para a mais recente; a última é o destino
+    ordem = sorted(dfs, key=ultimo_mes)
+    destino = ordem[-1]
+    partes = [df if df is destino else alinhar_contas(destino.index, df) for df in ordem]
+    junto = pd.concat(partes, axis=1)
+
+    meses = [mes_absoluto(c) for c in junto.columns]
+    ids = [c if m is None else m for c, m in zip(junto.columns, meses)]
+    manter = ~pd.Index(ids).duplicated(keep='last')
+    junto = junto.loc[:, manter]
+    if all(m is not None for m in meses):
+        junto = junto.iloc[:, sorted(range(junto.shape[1]), key=lambda i: mes_absoluto(junto.columns[i]))]
+
+    junto.attrs['celulas_invalidas'] = sum(df.attrs.get('celulas_invalidas', 0) for df in dfs)
+    if all(df.attrs.get('origem') == 'cache_disco' for df in dfs):
+        junto.attrs['origem'] = 'cache_disco'
+    return junto
+
+
+def consolidar(dfs):
+    """Empilha {unidade: DataFrame} em um único DataFrame com índice (unidade, conta).
+
+    Os meses são unidos mantendo a ordem de aparição; meses ausentes em uma
+    unidade ficam como NaN. As células que falharam na conversão numérica
+    ficam em df.attrs['celulas_invalidas'], por unidade.
+    """
+    df = pd.concat(dfs, names=['unidade', 'conta'], sort=False)
+    df.attrs['celulas_invalidas'] = {unidade: d.attrs.get('celulas_invalidas', 0) for unidade, d in dfs.items()}
+    return df
+
+
+# --- VISÕES POR UNIDADE ---
+def visao_unidade(df_consolidado, unidade):
+    """DataFrame de uma unidade (ou agregado) no formato de planilha única usado pelas páginas."""
+    if unidade == CONSOLIDADO_SOMA:
+        return agregar_unidades(df_consolidado, 'sum')
+    if unidade == CONSOLIDADO_MEDIA:
+        return agregar_unidades(df_consolidado, 'mean')
+    return df_consolidado.xs(unidade, level='unidade').dropna(how='all', axis=1)
+
+
+def agregar_unidades(df_consolidado, como='sum'):
+    """Agrega todas as unidades linha a linha.
+
+    Os grupos são definidos por posição de linha, então as contas são casadas
+    pela posição dentro de cada unidade (e não pelo rótulo, que pode se repetir).
+    Os rótulos vêm da primeira unidade que tiver a linha.
+
+    Só entram os meses que existem em todas as unidades: um mês parcial (ex.:
+    acrescentado a uma unidade só) mudaria a soma e a média sem que nada tivesse
+    mudado de fato.
+    """
+    presentes = df_consolidado.notna().groupby(level='unidade', sort=False).any().all()
+    df_consolidado = df_consolidado.loc[:, presentes.to_numpy()]
+    posicao = df_consolidado.groupby(level='unidade', sort=False).cumcount().to_numpy()
+    valores = df_consolidado.reset_index(drop=True)
+    if como == 'sum':
+        agregado = valores.groupby(posicao).sum(min_count=1)
+    else:
+        agregado = valores.groupby(posicao).agg(como)
+    rotulos = pd.Series(df_consolidado.index.get_level_values('conta')).groupby(posicao).first()
+    agregado.index = pd.Index(rotulos.to_numpy(), name=None)
+    return agregado
+
+
+def unidades_reais(df_consolidado):
+    return df_consolidado.index.get_level_values('unidade').unique().tolist()
+
+
+def alinhar_contas(index_destino, novos):
+    """Reordena as linhas de `novos` para o layout de `index_destino`.
+
+    Casa as contas pelo rótulo quando os rótulos não se repetem; caso contrário
+    exige o mesmo número de linhas e casa pela posição.
+    """
+    if index_destino.is_unique and novos.index.is_unique:
+        if not novos.index.isin(index_destino).any():
+            raise ValueError("Nenhuma conta da planilha nova existe no dataset carregado.")
+        return novos.reindex(index_destino)
+    if len(novos) != len(index_destino):
+        raise ValueError("As contas se repetem e a planilha nova não tem o mesmo número de linhas do dataset.")
+    return novos.set_axis(index_destino, axis=0)
+
+
+def opcoes_unidade(df_consolidado):
+    """Unidades para o seletor; os consolidados só entram se houver algum mês que todas as unidades têm."""
+    unidades = unidades_reais(df_consolidado)
+    if len(unidades) > 1 and df_consolidado.notna().groupby(level='unidade', sort=False).any().all().any():
+        return unidades + [CONSOLIDADO_SOMA, CONSOLIDADO_MEDIA]
+    return unidades
@@ -0,0 +1,140 @@
+# core/dados.py
+
+from io import BytesIO
+from zipfile import BadZipFile
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+
+from core import cache_disco
+from core.instrumentacao import secao
+
+# --- LAYOUT DA PLANILHA ---
+GRUPOS = {
+    'CMV': (1, 9), 'Folha': (10, 28), 'Folha Retorno': (29, 39),
+    'Despesas Gerais': (40, 64), 'Estoques': (65, 68), 'Descontos': (69, 80),
+    'Compras e Ineficiência': (81, 83)
+}
+
+# Linhas convertidas por vez na leitura em streaming
+TAMANHO_BLOCO = 2048
+
+
+# --- CONVERSÃO NUMÉRICA ---
+def converter_bloco(valores):
+    """Converte um bloco (ndarray de objetos) para float, aceitando o formato brasileiro.
+
+    Números já lidos como número passam direto; apenas as células de texto que
+    não convertem de primeira são normalizadas ("1.234,56" -> "1234.56").
+    Retorna (ndarray float, quantidade de células não vazias que viraram NaN).
+    """
+    plano = pd.Series(valores.ravel(), dtype=object)
+    numeros = pd.to_numeric(plano, errors='coerce')
+    # Células booleanas (VERDADEIRO/FALSO) não são valores: viram NaN e contam como falha.
+    # Só os 0/1 convertidos podem ter vindo de um booleano, então só eles têm o tipo verificado.
+    zero_um = numeros.isin((0, 1))
+    if zero_um.any():
+        booleano = plano[zero_um].map(lambda v: isinstance(v, (bool, np.bool_)))
+        numeros[booleano[booleano].index] = np.nan
+
+    falhou = numeros.isna() & plano.notna()
+    if falhou.any():
+        textos = plano[falhou]
+        textos = textos[textos.map(type) == str].str.strip()
+        com_virgula = textos.str.contains(',', regex=False)
+        textos[com_virgula] = textos[com_virgula].str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+        numeros[textos.index] = pd.to_numeric(textos, errors='coerce')
+        # Texto vazio não conta como falha
+        vazio = plano[falhou].map(lambda v: isinstance(v, str) and not v.strip())
+        falhou = numeros.isna() & plano.notna()
+        falhou[vazio[vazio].index] = False
+
+    return numeros.to_numpy(dtype=float).reshape(valores.shape), int(falhou.sum())
+
+
+def _nomes_colunas(cabecalho):
+    # Mesmos nomes que o pd.read_excel geraria (Unnamed: n, duplicadas com sufixo .1, .2...)
+    nomes, vistos = [], {}
+    for j, nome in enumerate(cabecalho):
+        if nome is None:
+            nome = f"Unnamed: {j + 1}"
+        if nome in vistos:
+            vistos[nome] += 1
+            nome = f"{nome}.{vistos[nome]}"
+        else:
+            vistos[nome] = 0
+        nomes.append(nome)
+    return nomes
+
+
+def _ler_streaming(file_content):
+    wb = load_workbook(BytesIO(file_content), read_only=True, data_only=True)
+    try:
+        linhas = wb.worksheets[0].iter_rows(values_only=True)
+        cabecalho = next(linhas, None)
+        if cabecalho is None:
+            return pd.DataFrame()
+        largura = len(cabecalho) - 1
+
+        rotulos, blocos, falhas = [], [], 0
+        bloco = []
+        for linha in linhas:
+            rotulos.append(linha[0] if linha else None)
+            valores = tuple(linha[1:largura + 1])
+            bloco.append(valores + (None,) * (largura - len(valores)))
+            if len(bloco) == TAMANHO_BLOCO:
+                convertido, n = converter_bloco(np.array(bloco, dtype=object).reshape(len(bloco), largura))
+                blocos.append(convertido)
+                falhas += n
+                bloco = []
+        if bloco:
+            convertido, n = converter_bloco(np.array(bloco, dtype=object).reshape(len(bloco), largura))
+            blocos.append(convertido)
+            falhas += n
+    finally:
+        wb.close()
+
+    valores = np.vstack(blocos) if blocos else np.empty((0, largura))
+    df = pd.DataFrame(valores, index=pd.Index(rotulos, name=cabecalho[0]), columns=_nomes_colunas(cabecalho[1:]))
+    df.attrs['celulas_invalidas'] = falhas
+    return df
+
+
+def ler_excel(file_content):
+    try:
+        df = _ler_streaming(file_content)
+    except (InvalidFileException, BadZipFile):
+        # Formatos que o openpyxl não lê (ex.: .xls, que não é um zip) passam pelo pandas
+        bruto = pd.read_excel(BytesIO(file_content), header=0, index_col=0, dtype=object)
+        valores, falhas = converter_bloco(bruto.to_numpy(dtype=object))
+        df = pd.DataFrame(valores, index=bruto.index, columns=bruto.columns)
+        df.attrs['celulas_invalidas'] = falhas
+    df.dropna(how='all', axis=0, inplace=True)
+    df.dropna(how='all', axis=1, inplace=True)
+    return df
+
+
+def planilha_em_cache(chave):
+    """Planilha já convertida no cache em disco, ou None se ainda não foi lida."""
+    df = cache_disco.ler(chave)
+    if df is not None:
+        df.attrs['origem'] = 'cache_disco'
+    return df
+
+
+def ler_e_guardar(file_content, chave):
+    """Lê a planilha do Excel e grava o resultado no cache em disco."""
+    with secao("ler_excel"):
+        df = ler_excel(file_content)
+    cache_disco.gravar(chave, df)
+    df.attrs['origem'] = 'excel'
+    return df
+
+
+def carregar_planilha(file_content):
+    """Lê a planilha usando o cache em disco (chave = hash do conteúdo)."""
+    chave = cache_disco.hash_conteudo(file_content)
+    df = planilha_em_cache(chave)
+    return ler_e_guardar(file_content, chave) if df is None else df
@@ -0,0 +1,61 @@
+# core/diagnostico.py
+
+import pandas as pd
+
+from core.instrumentacao import secao
+from core.tendencia import calcular_tendencia
+
+# Critérios do diagnóstico automático: nome -> (coluna da análise, ordem crescente, formato do valor)
+# Na tendência e no desempenho recente o menor valor vem primeiro; na volatilidade, o maior.
+CRITERIOS = {
+    "Pior Tendência (Crescimento)": ('tendencia_linear', True, "{:.2f}/mês"),
+    "Pior Desempenho Recente": ('desempenho_recente', True, "{:,.2f}"),
+    "Maior Volatilidade": ('volatilidade', False, "{:,.2f}"),
+}
+
+# Períodos pré-calculados em segundo plano: histórico completo e últimos N meses
+PERIODOS_COMUNS = (None, 12, 6, 3)
+
+
+def periodos_comuns(n_meses):
+    """Pares (inicio, fim) dos períodos comuns, com pelo menos 2 meses cada."""
+    periodos = []
+    for n in PERIODOS_COMUNS:
+        inicio = 0 if n is None else max(n_meses - n, 0)
+        par = (inicio, n_meses - 1)
+        if par[1] - par[0] >= 1 and par not in periodos:
+            periodos.append(par)
+    return periodos
+
+
+# --- MÉTRICAS DE ANÁLISE DE UM GRUPO ---
+def calcular_analise(df, indice, faixa, inicio, fim):
+    """Último valor, média histórica, desempenho recente, volatilidade e tendência de cada conta do grupo.
+
+    `faixa` é o par (primeira, última linha) do grupo; `inicio` e `fim` são as
+    posições (inclusive) dos meses do período.
+    """
+    start_g, end_g = faixa
+    df_grupo = df.iloc[start_g:min(end_g + 1, len(df)), inicio:fim + 1]
+
+    analise_df = pd.DataFrame(index=df_grupo.index)
+    analise_df['ultimo_valor'] = df_grupo.iloc[:, -1]
+    analise_df['media_historica'] = indice.media(inicio, fim - 1).iloc[start_g:end_g + 1]
+    analise_df['desempenho_recente'] = analise_df['ultimo_valor'] - analise_df['media_historica']
+    analise_df['volatilidade'] = indice.desvio(inicio, fim).iloc[start_g:end_g + 1]
+    with secao("calcular_tendencia"):
+        analise_df['tendencia_linear'] = calcular_tendencia(df_grupo)
+    analise_df.fillna(0, inplace=True)
+    return analise_df
+
+
+def pontos_de_atencao(analise_df, criterio, top_n):
+    """As `top_n` contas da análise que mais chamam atenção pelo critério (chave de CRITERIOS)."""
+    coluna, crescente, _ = CRITERIOS[criterio]
+    return analise_df.sort_values(by=coluna, ascending=crescente).head(top_n)
+
+
+def formatar_criterio(dados, criterio):
+    """Valor de uma linha da análise no formato de exibição do critério."""
+    coluna, _, formato = CRITERIOS[criterio]
+    return formato.format(dados[coluna])
@@ -0,0 +1,84 @@
+# core/graficos.py
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from core.instrumentacao import anotar, secao
+
+FIGURAS_MAX = int(os.environ.get("DASHPL_FIGURAS_MAX", "256"))
+# Acima deste número de células o mapa de calor é agregado antes de ir para o navegador
+MAX_CELULAS_MAPA = int(os.environ.get("DASHPL_MAX_CELULAS_MAPA", "20000"))
+# A partir deste número de pontos os gráficos de linha usam WebGL
+LIMIAR_WEBGL = int(os.environ.get("DASHPL_LIMIAR_WEBGL", "1000"))
+
+
+# --- CACHE DE FIGURAS ---
+class CacheFiguras:
+    """Cache LRU de figuras Plotly já montadas, compartilhado entre as sessões.
+
+    A chave deve identificar tudo de que a figura depende: hash do dataset,
+    unidade, tipo de gráfico, grupo, intervalo de meses e opções.
+    """
+
+    def __init__(self, max_itens=FIGURAS_MAX):
+        self.max_itens = max_itens
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave, construir):
+        with secao("figura"):
+            with self._lock:
+                if chave in self._itens:
+                    self._itens.move_to_end(chave)
+                    anotar(cache='hit')
+                    return self._itens[chave]
+            anotar(cache='miss')
+            figura = construir()
+            with self._lock:
+                self._itens[chave] = figura
+                self._itens.move_to_end(chave)
+                while len(self._itens) > self.max_itens:
+                    self._itens.popitem(last=False)
+            return figura
+
+
+FIGURAS = CacheFiguras()
+
+
+# --- REDUÇÃO DE GRÁFICOS GRANDES ---
+def reduzir_mapa_calor(df, max_celulas=MAX_CELULAS_MAPA):
+    """Agrega meses consecutivos (média) até o mapa caber em `max_celulas`.
+
+    Se mesmo com uma coluna por conta o mapa não couber, mantém as contas de
+    maior média absoluta. Retorna (DataFrame, descrição da redução ou None).
+    """
+    n_linhas, n_meses = df.shape
+    if n_linhas * n_meses <= max_celulas or n_meses == 0:
+        return df, None
+
+    notas = []
+    max_colunas = max(max_celulas // max(n_linhas, 1), 1)
+    if n_meses > max_colunas:
+        tamanho = int(np.ceil(n_meses / max_colunas))
+        grupos_meses = np.arange(n_meses) // tamanho
+        rotulos = [f"{df.columns[i]} – {df.columns[min(i + tamanho, n_meses) - 1]}" if tamanho > 1 else str(df.columns[i])
+                   for i in range(0, n_meses, tamanho)]
+        df = df.T.groupby(grupos_meses).mean().T
+        df.columns = rotulos
+        notas.append(f"médias a cada {tamanho} meses")
+
+    max_linhas = max(max_celulas // df.shape[1], 1)
+    if df.shape[0] > max_linhas:
+        maiores = df.abs().mean(axis=1).nlargest(max_linhas).index
+        df = df.loc[df.index.isin(maiores)]
+        notas.append(f"{max_linhas} contas de maior valor médio")
+
+    return df, "Gráfico reduzido para o navegador: " + ", ".join(notas) + "."
+
+
+def modo_renderizacao(n_pontos, limiar=LIMIAR_WEBGL):
+    """'webgl' para séries grandes, 'svg' para as pequenas (argumento render_mode do px.line)."""
+    return 'webgl' if n_pontos > limiar else 'svg'
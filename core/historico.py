@@ -0,0 +1,235 @@
+# core/historico.py
+
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from core.consolidacao import CONSOLIDADO_MEDIA, CONSOLIDADO_SOMA, unidades_reais
+from core.texto import mes_absoluto
+
+# --- CONFIGURAÇÃO DO HISTÓRICO LOCAL ---
+# Todo dataset carregado é gravado em um SQLite local, uma linha por
+# (unidade, conta, mês). As contas são identificadas pela posição na planilha
+# (como os grupos); o rótulo mais recente de cada posição fica na tabela contas.
+# Carregar a planilha de outro ano acrescenta meses ao mesmo histórico. A coluna
+# `ate` guarda até que mês ia o dataset que gravou a linha, para que uma planilha
+# antiga recarregada não sobrescreva valores e rótulos de uma mais nova.
+CAMINHO_HISTORICO = os.environ.get(
+    "DASHPL_HISTORICO",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".dashpl_historico.sqlite")
+)
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS datasets (chave TEXT PRIMARY KEY, nome TEXT, gravado_em REAL);
+CREATE TABLE IF NOT EXISTS contas (
+    unidade TEXT NOT NULL, posicao INTEGER NOT NULL, conta TEXT, ate INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (unidade, posicao)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS valores (
+    unidade TEXT NOT NULL, posicao INTEGER NOT NULL, mes INTEGER NOT NULL, valor REAL, ate INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (unidade, posicao, mes)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS valores_mes ON valores (unidade, mes);
+"""
+
+# Gravações em segundo plano, uma por vez (o SQLite só tem um escritor)
+_GRAVACOES = ThreadPoolExecutor(max_workers=1, thread_name_prefix="historico")
+
+
+# --- MESES COMO NÚMERO ---
+def rotulo_mes(mes):
+    """Rótulo "AAAA-MM" de um mês absoluto."""
+    return f"{mes // 12}-{mes % 12 + 1:02d}"
+
+
+def meses_nao_reconhecidos(colunas):
+    """Rótulos de `colunas` sem mês e ano reconhecíveis: não entram no histórico."""
+    return [str(c) for c in colunas if mes_absoluto(c) is None]
+
+
+def unidades_da_visao(unidade, df_consolidado):
+    """(unidades, agregação) para consultar o histórico na mesma visão selecionada nas páginas."""
+    if unidade == CONSOLIDADO_SOMA:
+        return unidades_reais(df_consolidado), 'SUM'
+    if unidade == CONSOLIDADO_MEDIA:
+        return unidades_reais(df_consolidado), 'AVG'
+    return [unidade], 'SUM'
+
+
+# --- ARMAZENAMENTO ---
+class HistoricoLocal:
+    """Histórico de todos os datasets carregados, consultado por fatias.
+
+    As consultas filtram unidade, faixa de contas e faixa de meses no próprio
+    SQLite (chave primária (unidade, posicao, mes)), então só as linhas pedidas
+    são lidas. Cada operação abre a própria conexão, então o objeto pode ser
+    usado por várias sessões/threads ao mesmo tempo.
+    """
+
+    def __init__(self, caminho=CAMINHO_HISTORICO):
+        self.caminho = caminho
+        self._pronto = False
+
+    @contextmanager
+    def _conectar(self):
+        # Uma transação por operação; a conexão é fechada ao final
+        conexao = sqlite3.connect(self.caminho, timeout=30)
+        try:
+            if not self._pronto:
+                conexao.execute("PRAGMA journal_mode=WAL")  # leituras não esperam as gravações
+                conexao.executescript(_ESQUEMA)
+                for tabela in ('contas', 'valores'):
+                    # Históricos gravados antes da coluna `ate`
+                    if 'ate' not in [c[1] for c in conexao.execute(f"PRAGMA table_info({tabela})")]:
+                        conexao.execute(f"ALTER TABLE {tabela} ADD COLUMN ate INTEGER NOT NULL DEFAULT 0")
+                self._pronto = True
+            with conexao:
+                yield conexao
+        finally:
+            conexao.close()
+
+    def gravar(self, df_consolidado, chave, nome=""):
+        """Grava (ou atualiza) os valores de um dataset com índice (unidade, conta).
+
+        Um dataset já gravado (mesma chave) não é regravado; células vazias não
+        são gravadas. Quando a mesma unidade, conta e mês já existem, fica o valor
+        (e o rótulo da conta) do dataset que vai até o mês mais recente daquela
+        unidade; entre dois que terminam no mesmo mês, o último gravado. Assim
+        recarregar uma planilha antiga não desfaz os dados de uma mais nova.
+        Retorna a lista de rótulos de meses não reconhecidos (não gravados), ou
+        None se o histórico não puder ser gravado.
+        """
+        meses = [mes_absoluto(m) for m in df_consolidado.columns]
+        ignorados = meses_nao_reconhecidos(df_consolidado.columns)
+        colunas = [i for i, m in enumerate(meses) if m is not None]
+        try:
+            with self._conectar() as conexao:
+                if conexao.execute("SELECT 1 FROM datasets WHERE chave = ?", (chave,)).fetchone():
+                    return ignorados
+
+                unidades = df_consolidado.index.get_level_values('unidade').to_numpy(dtype=object)
+                posicoes = df_consolidado.groupby(level='unidade', sort=False).cumcount().to_numpy()
+                contas = df_consolidado.index.get_level_values('conta').astype(str)
+                valores = df_consolidado.iloc[:, colunas].to_numpy()
+                if valores.dtype == np.float32:
+                    # Bloco compactado pelo registro: volta ao decimal exibido (0.1352, e não 0.13519999...)
+                    valores = valores.astype(str)
+                valores = valores.astype(np.float64)
+
+                # Uma linha por célula preenchida, montada de uma vez (linhas x meses)
+                preenchidos = ~np.isnan(valores)
+                linhas, cols = np.nonzero(preenchidos)
+                meses = np.array([meses[i] for i in colunas], dtype=np.int64)
+                ultimo = np.where(preenchidos, meses[None, :], -1).max(axis=1, initial=-1)
+                ate = pd.Series(ultimo).groupby(unidades).transform('max').to_numpy()
+                conexao.executemany(
+                    "INSERT INTO contas VALUES (?, ?, ?, ?) ON CONFLICT (unidade, posicao) DO UPDATE"
+                    " SET conta = excluded.conta, ate = excluded.ate WHERE excluded.ate >= contas.ate",
+                    zip(unidades.tolist(), posicoes.tolist(), contas, ate.tolist()))
+                conexao.executemany(
+                    "INSERT INTO valores VALUES (?, ?, ?, ?, ?) ON CONFLICT (unidade, posicao, mes) DO UPDATE"
+                    " SET valor = excluded.valor, ate = excluded.ate WHERE excluded.ate >= valores.ate",
+                    zip(unidades[linhas].tolist(), posicoes[linhas].tolist(), meses[cols].tolist(),
+                        valores[linhas, cols].tolist(), ate[linhas].tolist()))
+                conexao.execute("INSERT INTO datasets VALUES (?, ?, ?)", (chave, nome, time.time()))
+        except sqlite3.Error:
+            return None
+        return ignorados
+
+    def gravar_em_segundo_plano(self, df_consolidado, chave, nome=""):
+        """Agenda o gravar() fora da execução da página; retorna o Future com o mesmo resultado."""
+        return _GRAVACOES.submit(self.gravar, df_consolidado, chave, nome)
+
+    def unidades(self):
+        with self._conectar() as conexao:
+            return [u for (u,) in conexao.execute("SELECT DISTINCT unidade FROM contas ORDER BY unidade")]
+
+    def meses(self, unidades):
+        """Meses absolutos disponíveis para as `unidades`, em ordem."""
+        marcadores = ",".join("?" * len(unidades))
+        with self._conectar() as conexao:
+            return [m for (m,) in conexao.execute(
+                f"SELECT DISTINCT mes FROM valores WHERE unidade IN ({marcadores}) ORDER BY mes", list(unidades))]
+
+    def _filtro(self, unidades, faixa, inicio, fim):
+        condicoes, parametros = [f"unidade IN ({','.join('?' * len(unidades))})"], list(unidades)
+        if faixa is not None:
+            condicoes.append("posicao BETWEEN ? AND ?")
+            parametros += [int(faixa[0]), int(faixa[1])]
+        if inicio is not None:
+            condicoes.append("mes >= ?")
+            parametros.append(int(inicio))
+        if fim is not None:
+            condicoes.append("mes <= ?")
+            parametros.append(int(fim))
+        return " AND ".join(condicoes), parametros
+
+    def _rotulos(self, conexao, unidades, posicoes):
+        # Rótulo de cada posição na primeira unidade (em ordem) que tiver a conta, como no agregado das páginas
+        rotulos = {}
+        if not posicoes:
+            return rotulos
+        marcadores = ",".join("?" * len(posicoes))
+        for unidade in unidades:
+            for posicao, conta in conexao.execute(
+                    f"SELECT posicao, conta FROM contas WHERE unidade = ? AND posicao IN ({marcadores})",
+                    [unidade] + list(posicoes)):
+                rotulos.setdefault(posicao, conta)
+        return rotulos
+
+    def serie(self, unidades, faixa=None, inicio=None, fim=None, agregacao='SUM'):
+        """Valores das contas nas posições `faixa` (primeira, última) entre os meses `inicio` e `fim`.
+
+        Retorna um DataFrame no formato das páginas (contas nas linhas, meses
+        "AAAA-MM" nas colunas). Com várias unidades os valores são agregados por
+        `agregacao` ('SUM' ou 'AVG').
+        """
+        where, parametros = self._filtro(unidades, faixa, inicio, fim)
+        with self._conectar() as conexao:
+            linhas = conexao.execute(
+                f"SELECT posicao, mes, {agregacao}(valor) FROM valores WHERE {where} GROUP BY posicao, mes",
+                parametros).fetchall()
+            longo = pd.DataFrame(linhas, columns=['posicao', 'mes', 'valor'], dtype=float)
+            if longo.empty:
+                return pd.DataFrame()
+            largo = longo.pivot(index='posicao', columns='mes', values='valor').sort_index().sort_index(axis=1)
+            rotulos = self._rotulos(conexao, unidades, largo.index.astype(int).tolist())
+        largo.index = [rotulos.get(int(p)) for p in largo.index]
+        largo.columns = [rotulo_mes(int(m)) for m in largo.columns]
+        return largo
+
+    def comparativo_anual(self, unidades, faixa=None, inicio=None, fim=None, agregacao='SUM'):
+        """Cada mês ao lado do mesmo mês do ano anterior, calculado no SQLite.
+
+        Retorna um DataFrame longo com posicao, conta, mes ("AAAA-MM"), ano,
+        mes_do_ano, valor, valor_ano_anterior e variacao (relativa).
+        """
+        where, parametros = self._filtro(unidades, faixa, None if inicio is None else inicio - 12, fim)
+        sql = f"""
+            WITH s AS (SELECT posicao, mes, {agregacao}(valor) AS valor FROM valores WHERE {where} GROUP BY posicao, mes)
+            SELECT a.posicao, a.mes, a.valor, b.valor FROM s a
+            LEFT JOIN s b ON b.posicao = a.posicao AND b.mes = a.mes - 12
+            {'' if inicio is None else 'WHERE a.mes >= ?'}
+            ORDER BY a.posicao, a.mes
+        """
+        with self._conectar() as conexao:
+            linhas = conexao.execute(sql, parametros + ([] if inicio is None else [int(inicio)])).fetchall()
+            resultado = pd.DataFrame(linhas, columns=['posicao', 'mes', 'valor', 'valor_ano_anterior'])
+            rotulos = self._rotulos(conexao, unidades, resultado['posicao'].unique().tolist())
+        resultado[['valor', 'valor_ano_anterior']] = resultado[['valor', 'valor_ano_anterior']].astype(float)
+        resultado.insert(1, 'conta', resultado['posicao'].map(rotulos))
+        resultado['ano'] = resultado['mes'] // 12
+        resultado['mes_do_ano'] = resultado['mes'] % 12 + 1
+        anterior = resultado['valor_ano_anterior'].to_numpy()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            resultado['variacao'] = np.where(anterior != 0, resultado['valor'].to_numpy() / anterior - 1, np.nan)
+        resultado['mes'] = resultado['mes'].map(rotulo_mes)
+        return resultado
+
+
+HISTORICO = HistoricoLocal()
@@ -0,0 +1,116 @@
+# core/indice_periodo.py
+
+import copy
+
+import numpy as np
+import pandas as pd
+
+
+# --- ÍNDICE DE INTERVALOS DE MESES ---
+class IndicePeriodo:
+    """Estatísticas por conta para qualquer intervalo de meses sem reler os dados.
+
+    Construído uma vez por planilha carregada. Guarda somas acumuladas,
+    somas de quadrados e contagens (para média e desvio padrão) e sparse
+    tables de mínimo/máximo, de modo que cada consulta de intervalo custa
+    O(1) por conta. Os valores ausentes são ignorados, como no pandas.
+    """
+
+    def __init__(self, df):
+        self.index = df.index
+        valores = df.to_numpy(dtype=float)
+        validos = ~np.isnan(valores)
+        n_linhas, n_meses = valores.shape
+
+        # Desloca cada linha pela sua média para evitar perda de precisão na soma de quadrados
+        n_validos = validos.sum(axis=1)
+        self._deslocamento = np.divide(np.where(validos, valores, 0.0).sum(axis=1), n_validos,
+                                       out=np.zeros(n_linhas), where=n_validos > 0)
+        centrados = np.where(validos, valores - self._deslocamento[:, None], 0.0)
+
+        zeros = np.zeros((n_linhas, 1))
+        self._soma = np.hstack([zeros, np.cumsum(centrados, axis=1)])
+        self._soma_quad = np.hstack([zeros, np.cumsum(centrados * centrados, axis=1)])
+        self._contagem = np.hstack([zeros, np.cumsum(validos, axis=1)])
+
+        # Sparse tables: nível k guarda min/max das janelas de tamanho 2**k
+        self._minimos = [valores]
+        self._maximos = [valores]
+        k = 1
+        while (1 << k) <= n_meses:
+            meio = 1 << (k - 1)
+            anterior_min, anterior_max = self._minimos[-1], self._maximos[-1]
+            with np.errstate(invalid='ignore'):
+                self._minimos.append(np.fmin(anterior_min[:, :-meio], anterior_min[:, meio:]))
+                self._maximos.append(np.fmax(anterior_max[:, :-meio], anterior_max[:, meio:]))
+            k += 1
+
+    def anexar(self, novas):
+        """Novo índice com as colunas de `novas` (mesmas linhas) acrescentadas ao final.
+
+        Só as posições que dependem dos meses novos são calculadas; o índice
+        atual não é alterado, pois pode estar em uso por outras sessões.
+        """
+        valores = novas.to_numpy(dtype=float)
+        validos = ~np.isnan(valores)
+        centrados = np.where(validos, valores - self._deslocamento[:, None], 0.0)
+
+        novo = copy.copy(self)
+        novo._soma = np.hstack([self._soma, self._soma[:, -1:] + np.cumsum(centrados, axis=1)])
+        novo._soma_quad = np.hstack([self._soma_quad, self._soma_quad[:, -1:] + np.cumsum(centrados * centrados, axis=1)])
+        novo._contagem = np.hstack([self._contagem, self._contagem[:, -1:] + np.cumsum(validos, axis=1)])
+
+        novo._minimos = [np.hstack([self._minimos[0], valores])]
+        novo._maximos = [np.hstack([self._maximos[0], valores])]
+        n_meses = novo._minimos[0].shape[1]
+        k = 1
+        while (1 << k) <= n_meses:
+            meio = 1 << (k - 1)
+            existentes = self._minimos[k].shape[1] if k < len(self._minimos) else 0
+            inicio = np.arange(existentes, n_meses - (1 << k) + 1)
+            anterior_min, anterior_max = novo._minimos[-1], novo._maximos[-1]
+            with np.errstate(invalid='ignore'):
+                novos_min = np.fmin(anterior_min[:, inicio], anterior_min[:, inicio + meio])
+                novos_max = np.fmax(anterior_max[:, inicio], anterior_max[:, inicio + meio])
+            if existentes:
+                novos_min = np.hstack([self._minimos[k], novos_min])
+                novos_max = np.hstack([self._maximos[k], novos_max])
+            novo._minimos.append(novos_min)
+            novo._maximos.append(novos_max)
+            k += 1
+        return novo
+
+    def estatisticas(self, inicio, fim):
+        """Média, desvio padrão (ddof=1), mínimo, máximo e contagem das colunas inicio..fim (inclusive)."""
+        fim_excl = fim + 1
+        n = self._contagem[:, fim_excl] - self._contagem[:, inicio]
+        soma = self._soma[:, fim_excl] - self._soma[:, inicio]
+        soma_quad = self._soma_quad[:, fim_excl] - self._soma_quad[:, inicio]
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            media_centrada = np.where(n > 0, soma / n, np.nan)
+            variancia = np.where(n > 1, (soma_quad - soma * media_centrada) / (n - 1), np.nan)
+        desvio = np.sqrt(np.clip(variancia, 0.0, None))
+
+        if fim_excl > inicio:
+            k = (fim_excl - inicio).bit_length() - 1
+            fim_janela = fim_excl - (1 << k)
+            with np.errstate(invalid='ignore'):
+                minimo = np.fmin(self._minimos[k][:, inicio], self._minimos[k][:, fim_janela])
+                maximo = np.fmax(self._maximos[k][:, inicio], self._maximos[k][:, fim_janela])
+        else:
+            minimo = maximo = np.full(len(self.index), np.nan)
+
+        return pd.DataFrame({
+            'media': media_centrada + self._deslocamento,
+            'desvio': desvio,
+            'minimo': minimo,
+            'maximo': maximo,
+            'contagem': n.astype(int),
+        }, index=self.index)
+
+    def media(self, inicio, fim):
+        return self.estatisticas(inicio, fim)['media']
+
+    def desvio(self, inicio, fim):
+        return self.estatisticas(inicio, fim)['desvio']
@@ -0,0 +1,175 @@
+# core/instrumentacao.py
+
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# --- CONFIGURAÇÃO ---
+# DASHPL_METRICAS liga a instrumentação para todas as sessões, com os modos
+# separados por vírgula: "painel" (tempos na sidebar), "log" (JSON lines em
+# DASHPL_METRICAS_LOG) e "perfil" (perfil amostrado de toda execução).
+# Uma sessão também pode ligá-la pela URL: ?metricas=painel,log
+MODOS = ('painel', 'log', 'perfil')
+MODOS_AMBIENTE = frozenset(m.strip() for m in os.environ.get("DASHPL_METRICAS", "").split(",") if m.strip() in MODOS)
+ARQUIVO_LOG = os.environ.get(
+    "DASHPL_METRICAS_LOG",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".dashpl_metricas.jsonl")
+)
+INTERVALO_PERFIL = float(os.environ.get("DASHPL_PERFIL_INTERVALO_MS", "5")) / 1000
+
+_local = threading.local()
+_lock_log = threading.Lock()
+
+
+# --- PERFIL AMOSTRADO ---
+class PerfilAmostrado:
+    """Amostra a pilha de uma thread a cada `intervalo` segundos, em segundo plano.
+
+    Não depende de bibliotecas externas nem instrumenta as chamadas: o custo é
+    só o de ler a pilha da thread observada a cada amostra.
+    """
+
+    def __init__(self, thread_id=None, intervalo=INTERVALO_PERFIL):
+        self.thread_id = thread_id or threading.get_ident()
+        self.intervalo = intervalo
+        self.pilhas = Counter()
+        self.amostras = 0
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._amostrar, name="dashpl-perfil", daemon=True)
+
+    def _amostrar(self):
+        while not self._parar.wait(self.intervalo):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            pilha = []
+            while frame is not None:
+                codigo = frame.f_code
+                pilha.append(f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.pilhas[";".join(reversed(pilha))] += 1
+            self.amostras += 1
+
+    def iniciar(self):
+        self._thread.start()
+        return self
+
+    def parar(self):
+        self._parar.set()
+        self._thread.join()
+        return self
+
+    def principais(self, n=20):
+        """[(função, % das amostras no topo da pilha, % das amostras na pilha)] das `n` funções mais vistas."""
+        proprio, inclusivo = Counter(), Counter()
+        for pilha, contagem in self.pilhas.items():
+            quadros = pilha.split(";")
+            proprio[quadros[-1]] += contagem
+            for quadro in set(quadros):
+                inclusivo[quadro] += contagem
+        total = max(self.amostras, 1)
+        return [(quadro, 100 * c / total, 100 * inclusivo[quadro] / total) for quadro, c in proprio.most_common(n)]
+
+    def pilhas_colapsadas(self):
+        """Formato "pilha;...;função contagem" aceito por flamegraph.pl e speedscope."""
+        return "\n".join(f"{pilha} {contagem}" for pilha, contagem in self.pilhas.most_common())
+
+
+# --- COLETA POR EXECUÇÃO ---
+class Coletor:
+    """Tempos das seções de uma execução (rerun) de uma página, na ordem em que terminaram."""
+
+    def __init__(self, pagina, log=False, perfil=False):
+        self.pagina = pagina
+        self.log = log
+        self.registros = []
+        self.inicio = time.perf_counter()
+        self.inicio_relogio = time.time()
+        self.duracao_ms = None
+        self._abertas = []
+        self.perfil = PerfilAmostrado().iniciar() if perfil else None
+
+    def finalizar(self):
+        self.duracao_ms = (time.perf_counter() - self.inicio) * 1000
+        if self.perfil is not None:
+            self.perfil.parar()
+        if self.log:
+            gravar_log(self)
+        return self
+
+    def como_dict(self):
+        return {
+            'timestamp': self.inicio_relogio,
+            'pagina': self.pagina,
+            'duracao_ms': self.duracao_ms,
+            'secoes': self.registros,
+        }
+
+
+def iniciar(pagina, log=False, perfil=False):
+    """Começa a coletar os tempos da execução atual (na thread atual).
+
+    Uma coleta anterior que não chegou a ser finalizada (execução interrompida)
+    é encerrada antes, o que também para a thread do seu perfil amostrado.
+    """
+    finalizar()
+    _local.coletor = Coletor(pagina, log, perfil)
+    return _local.coletor
+
+
+def atual():
+    return getattr(_local, 'coletor', None)
+
+
+def finalizar():
+    """Encerra a coleta da execução atual e retorna o Coletor (ou None se não havia coleta)."""
+    coletor = atual()
+    _local.coletor = None
+    return coletor.finalizar() if coletor is not None else None
+
+
+@contextmanager
+def secao(nome, **atributos):
+    """Mede o bloco como uma seção da execução atual; sem coleta ativa, não faz nada.
+
+    Seções podem ser aninhadas (o nome registrado inclui as seções externas,
+    ex.: "analise_df/calcular_tendencia"). Atributos extras (ex.: cache='hit')
+    podem ser passados aqui ou adicionados dentro do bloco com anotar().
+    """
+    coletor = atual()
+    if coletor is None:
+        yield
+        return
+    registro = {'secao': "/".join([r['secao'] for r in coletor._abertas] + [nome]), **atributos}
+    coletor._abertas.append(registro)
+    inicio = time.perf_counter()
+    registro['inicio_ms'] = (inicio - coletor.inicio) * 1000
+    try:
+        yield
+    finally:
+        registro['duracao_ms'] = (time.perf_counter() - inicio) * 1000
+        registro['nivel'] = len(coletor._abertas) - 1
+        coletor._abertas.pop()
+        coletor.registros.append(registro)
+
+
+def anotar(**atributos):
+    """Adiciona atributos à seção aberta mais interna (ex.: acerto ou falta de cache)."""
+    coletor = atual()
+    if coletor is not None and coletor._abertas:
+        coletor._abertas[-1].update(atributos)
+
+
+# --- LOG ESTRUTURADO ---
+def gravar_log(coletor, caminho=None):
+    """Acrescenta a execução como uma linha JSON no log de métricas. Falhas de disco são ignoradas."""
+    try:
+        linha = json.dumps(coletor.como_dict(), ensure_ascii=False, default=str)
+        with _lock_log, open(caminho or ARQUIVO_LOG, "a", encoding="utf-8") as f:
+            f.write(linha + "\n")
+    except OSError:
+        pass
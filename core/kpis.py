@@ -0,0 +1,112 @@
+# core/kpis.py
+
+import numpy as np
+import pandas as pd
+
+from core.texto import normalizar
+
+# --- ESPECIFICAÇÃO DOS KPIs ---
+# chave: (linha na planilha, formato, trecho esperado no nome da conta)
+# formato: 'percent' (fração exibida como %), 'reais' (R$) ou 'numero'
+KPIS = {
+    'cmv_geral': (6, 'percent', 'cmv'),
+    'cmv_ab': (7, 'percent', 'cmv'),
+    'inef_perc': (8, 'numero', 'inef'),
+    'inef_rs': (9, 'reais', 'inef'),
+    'compras': (81, 'percent', 'compra'),
+    'inef_compra_perc': (82, 'percent', 'inef'),
+    'inef_compra_rs': (83, 'reais', 'inef'),
+    'desp_folha': (39, 'percent', 'folha'),
+    'desp_geral': (64, 'percent', 'desp'),
+    'descontos': (80, 'percent', 'desconto'),
+}
+
+# Blocos do resumo mensal (título, KPIs) e da análise histórica (título, KPI)
+SECOES_MENSAIS = [
+    ("CMV", ['cmv_geral', 'cmv_ab']),
+    ("Ineficiências", ['inef_perc', 'inef_rs']),
+    ("Compras e Descontos", ['compras', 'descontos']),
+    ("Despesas Totais", ['desp_folha', 'desp_geral']),
+]
+SECOES_HISTORICAS = [
+    ("CMV", 'cmv_geral'),
+    (None, 'cmv_ab'),
+    ("Ineficiência Compra R$", 'inef_compra_rs'),
+]
+
+# Um percentual guardado como fração não passa disso; acima, a linha provavelmente mudou
+LIMITE_PERCENTUAL = 10
+
+
+class LayoutInvalido(ValueError):
+    pass
+
+
+# --- FORMATAÇÃO (painel e relatórios) ---
+def formatar_valor(valor, percentual=False):
+    if not isinstance(valor, (int, float, np.floating)) or pd.isna(valor): return "N/A"
+    if percentual: return f"{valor:.2%}"
+    return f"{valor:,.2f}"
+
+
+def formatar_kpi(valor, formato):
+    if formato == 'reais': return f"R$ {formatar_valor(valor)}"
+    return formatar_valor(valor, formato == 'percent')
+
+
+# --- PAINEL DE KPIs CALCULADO DE UMA VEZ ---
+class PainelKpis:
+    """Todos os KPIs do resumo para todos os meses, calculados em uma única operação matricial.
+
+    As linhas da especificação são resolvidas e validadas uma vez por planilha:
+    se a conta na posição esperada não tiver o nome esperado, ou se um
+    percentual tiver valores fora da faixa de uma fração, LayoutInvalido é
+    levantado em vez de exibir o KPI de outra conta.
+    Cada atributo matricial tem uma linha por KPI (na ordem de `chaves`) e uma coluna por mês.
+    """
+
+    def __init__(self, df, kpis=KPIS):
+        problemas = []
+        for chave, (linha, formato, trecho) in kpis.items():
+            if linha >= len(df):
+                problemas.append(f"'{chave}': a planilha tem só {len(df)} linhas (esperada a linha {linha})")
+            elif trecho and trecho not in normalizar(df.index[linha]):
+                problemas.append(f"'{chave}': linha {linha} é '{df.index[linha]}' (esperado algo com '{trecho}')")
+            elif formato == 'percent' and np.nanmax(np.abs(df.iloc[linha].to_numpy(dtype=float)), initial=0) > LIMITE_PERCENTUAL:
+                problemas.append(f"'{chave}': linha {linha} ('{df.index[linha]}') não parece um percentual")
+        if problemas:
+            raise LayoutInvalido("Layout da planilha diferente do esperado: " + "; ".join(problemas))
+
+        self.chaves = list(kpis)
+        self.linhas = {chave: kpis[chave][0] for chave in self.chaves}
+        self.formatos = {chave: kpis[chave][1] for chave in self.chaves}
+        self.rotulos = {chave: df.index[linha] for chave, linha in self.linhas.items()}
+        self.months = df.columns.tolist()
+
+        self.valores = df.to_numpy(dtype=float)[[self.linhas[c] for c in self.chaves]]
+        n_kpis = len(self.chaves)
+
+        # Variação em relação ao mês anterior
+        self.delta_mensal = np.hstack([np.full((n_kpis, 1), np.nan), self.valores[:, 1:] - self.valores[:, :-1]])
+
+        # Média de todos os meses anteriores (ignorando vazios) e variação em relação a ela
+        validos = ~np.isnan(self.valores)
+        zeros = np.zeros((n_kpis, 1))
+        soma = np.hstack([zeros, np.cumsum(np.where(validos, self.valores, 0.0), axis=1)])[:, :-1]
+        contagem = np.hstack([zeros, np.cumsum(validos, axis=1)])[:, :-1]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.media_historica = np.where(contagem > 0, soma / contagem, np.nan)
+        self.delta_historico = self.valores - self.media_historica
+
+    def mes(self, indice_mes):
+        """{chave: {'valor', 'anterior', 'delta', 'media_historica', 'delta_historico'}} de um mês."""
+        resultado = {}
+        for i, chave in enumerate(self.chaves):
+            resultado[chave] = {
+                'valor': self.valores[i, indice_mes],
+                'anterior': self.valores[i, indice_mes - 1] if indice_mes > 0 else np.nan,
+                'delta': self.delta_mensal[i, indice_mes],
+                'media_historica': self.media_historica[i, indice_mes],
+                'delta_historico': self.delta_historico[i, indice_mes],
+            }
+        return resultado
@@ -0,0 +1,63 @@
+# core/previa.py
+
+import math
+
+import numpy as np
+import pandas as pd
+
+from core.texto import normalizar
+
+
+# --- PRÉ-VISUALIZAÇÃO PAGINADA ---
+class PreviaFormatada:
+    """Pré-visualização de uma planilha formatada sob demanda, em blocos de linhas.
+
+    Em vez de formatar o DataFrame inteiro com o Styler a cada execução, cada
+    bloco de `linhas_por_bloco` linhas é convertido para texto na primeira vez
+    em que aparece na tela e fica guardado (compartilhado entre as sessões).
+    A busca por nome de conta e o filtro por grupo rodam no servidor, sobre os
+    rótulos já normalizados.
+    """
+
+    def __init__(self, df, linhas_por_bloco=50, formato="{:,.2f}", na_rep="-"):
+        self.df = df
+        self.linhas_por_bloco = linhas_por_bloco
+        self.formato = formato
+        self.na_rep = na_rep
+        self._rotulos = np.array([normalizar(r) for r in df.index], dtype=object)
+        self._blocos = {}
+
+    def filtrar(self, termo="", faixa=None):
+        """Posições das linhas cujo nome contém `termo` (sem diferenciar acentos/maiúsculas) e que estão na `faixa`."""
+        posicoes = np.arange(len(self.df))
+        if faixa is not None:
+            inicio, fim = faixa
+            posicoes = posicoes[inicio:fim + 1]
+        termo = normalizar(termo.strip())
+        if termo:
+            posicoes = posicoes[[termo in r for r in self._rotulos[posicoes]]]
+        return posicoes
+
+    def n_paginas(self, posicoes, tamanho):
+        return max(math.ceil(len(posicoes) / tamanho), 1)
+
+    def janela(self, posicoes, pagina, tamanho):
+        """Linhas da página `pagina` (começando em 0) de `posicoes`, já formatadas como texto."""
+        selecionadas = posicoes[pagina * tamanho:(pagina + 1) * tamanho]
+        if len(selecionadas) == 0:
+            return pd.DataFrame(columns=self.df.columns)
+        partes = []
+        for bloco, linhas in pd.Series(selecionadas).groupby(selecionadas // self.linhas_por_bloco, sort=False):
+            formatado = self._bloco(bloco)
+            partes.append(formatado.iloc[linhas.to_numpy() - bloco * self.linhas_por_bloco])
+        return pd.concat(partes)
+
+    def _bloco(self, bloco):
+        formatado = self._blocos.get(bloco)
+        if formatado is None:
+            inicio = bloco * self.linhas_por_bloco
+            dados = self.df.iloc[inicio:inicio + self.linhas_por_bloco]
+            formatar = self.formato.format
+            formatado = dados.map(lambda v: self.na_rep if pd.isna(v) else formatar(v))
+            self._blocos[bloco] = formatado
+        return formatado
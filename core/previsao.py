@@ -0,0 +1,160 @@
+# core/previsao.py
+
+import copy
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from core.tendencia import ajustar_tendencias
+
+# Grade de parâmetros testada para todas as contas ao mesmo tempo
+ALPHAS = (0.1, 0.3, 0.5, 0.7, 0.9)
+BETAS = (0.01, 0.1, 0.3)
+GAMMA = 0.1
+PERIODO_SAZONAL = 12
+Z_INTERVALO = 1.96  # intervalo de ~95%
+
+
+# --- SUAVIZAÇÃO EXPONENCIAL EM LOTE ---
+class ModeloPrevisao:
+    """Holt (nível + tendência) com sazonalidade aditiva opcional, ajustado para todas as contas de uma vez.
+
+    Cada parâmetro da grade é avaliado em paralelo (matrizes grade x contas) e
+    cada conta fica com a combinação de menor erro quadrático de um passo.
+    A sazonalidade de 12 meses só é usada nas contas com pelo menos dois anos
+    completos de valores (ciclos sem meses vazios); as demais seguem só com
+    nível e tendência.
+    O estado ajustado (nível, tendência, sazonais e variância do erro) permite
+    incluir um novo mês com `atualizar`, sem reprocessar o histórico.
+    """
+
+    def __init__(self, index, nivel, tendencia, sazonal, fase, alpha, beta, gamma, sse, n_erros):
+        self.index = index
+        self.nivel = nivel
+        self.tendencia = tendencia
+        self.sazonal = sazonal  # (contas, período) ou None
+        self.fase = fase        # posição do próximo mês no ciclo sazonal
+        self.alpha, self.beta, self.gamma = alpha, beta, gamma
+        self.sse, self.n_erros = sse, n_erros
+
+    @classmethod
+    def ajustar(cls, df):
+        valores = df.to_numpy(dtype=float)
+        n_contas, n_meses = valores.shape
+        n_anos = n_meses // PERIODO_SAZONAL
+        anos = valores[:, :n_anos * PERIODO_SAZONAL].reshape(n_contas, n_anos, PERIODO_SAZONAL)
+        com_sazonal = (~np.isnan(anos)).all(axis=2).sum(axis=1) >= 2
+        sazonal_ativo = bool(com_sazonal.any())
+
+        grade = [(a, b) for a in ALPHAS for b in BETAS]
+        alpha = np.array([a for a, _ in grade])[:, None] * np.ones((1, n_contas))
+        beta = np.array([b for _, b in grade])[:, None] * np.ones((1, n_contas))
+        gamma = np.where(com_sazonal, GAMMA, 0.0)[None, :] * np.ones((len(grade), 1))
+
+        # Valores iniciais: sazonais pela média dos desvios de cada mês em relação à média
+        # do seu ano; tendência pela inclinação entre as médias anuais (ou dos primeiros
+        # 12 meses a partir do primeiro valor da conta, sem sazonalidade)
+        with np.errstate(invalid='ignore'), warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            primeiro = np.argmax(~np.isnan(valores), axis=1)
+            posicoes = primeiro[:, None] + np.arange(min(PERIODO_SAZONAL, n_meses))[None, :]
+            inicio = np.take_along_axis(np.pad(valores, ((0, 0), (0, PERIODO_SAZONAL)), constant_values=np.nan),
+                                        posicoes, axis=1)
+            tendencia_inicial = ajustar_tendencias(pd.DataFrame(inicio))['inclinacao'].to_numpy()
+            if sazonal_ativo:
+                media_anual = np.nanmean(anos, axis=2)
+                tendencia_anual = ajustar_tendencias(pd.DataFrame(media_anual))['inclinacao'].to_numpy() / PERIODO_SAZONAL
+                # Remove a tendência dentro do ano para ela não vazar para os sazonais
+                meses = np.arange(PERIODO_SAZONAL) - (PERIODO_SAZONAL - 1) / 2
+                desvios = anos - media_anual[:, :, None] - tendencia_anual[:, None, None] * meses
+                sazonal = np.where(com_sazonal[:, None], np.nan_to_num(np.nanmean(desvios, axis=1)), 0.0)
+                sazonal = np.broadcast_to(sazonal, (len(grade), n_contas, PERIODO_SAZONAL)).copy()
+                tendencia_inicial = np.where(com_sazonal, tendencia_anual, tendencia_inicial)
+            else:
+                sazonal = None
+
+        estado = cls(
+            df.index,
+            nivel=np.full((len(grade), n_contas), np.nan),
+            tendencia=np.broadcast_to(tendencia_inicial, (len(grade), n_contas)).copy(),
+            sazonal=sazonal, fase=0,
+            alpha=alpha, beta=beta, gamma=gamma,
+            sse=np.zeros((len(grade), n_contas)),
+            n_erros=np.zeros((len(grade), n_contas)),
+        )
+        for t in range(n_meses):
+            estado._passo(valores[:, t])
+
+        # Fica, para cada conta, a combinação da grade com menor erro médio
+        with np.errstate(invalid='ignore', divide='ignore'):
+            erro_medio = np.where(estado.n_erros > 0, estado.sse / estado.n_erros, np.inf)
+        melhor = np.argmin(erro_medio, axis=0)
+        colunas = np.arange(n_contas)
+        escolher = lambda m: m[melhor, colunas]  # noqa: E731
+        return cls(
+            df.index,
+            nivel=escolher(estado.nivel), tendencia=escolher(estado.tendencia),
+            sazonal=estado.sazonal[melhor, colunas] if sazonal_ativo else None, fase=estado.fase,
+            alpha=escolher(alpha), beta=escolher(beta), gamma=escolher(gamma),
+            sse=escolher(estado.sse), n_erros=escolher(estado.n_erros),
+        )
+
+    def _passo(self, y):
+        # Um mês de recursão, em todas as contas (e combinações da grade) ao mesmo tempo
+        s = self.sazonal[..., self.fase] if self.sazonal is not None else 0.0
+        valido = ~np.isnan(y)
+        previsto = self.nivel + self.tendencia + s
+        erro = y - previsto
+        com_erro = valido & ~np.isnan(previsto)
+        self.sse += np.where(com_erro, erro * erro, 0.0)
+        self.n_erros += com_erro
+
+        # Primeiro valor observado inicializa o nível
+        inicio = valido & np.isnan(self.nivel)
+        nivel_anterior = np.where(inicio, y - s, self.nivel)
+        base = nivel_anterior + np.where(inicio, 0.0, self.tendencia)
+
+        nivel = np.where(valido, self.alpha * (y - s) + (1 - self.alpha) * base, base)
+        tendencia = np.where(valido & ~inicio, self.beta * (nivel - nivel_anterior) + (1 - self.beta) * self.tendencia, self.tendencia)
+        if self.sazonal is not None:
+            self.sazonal[..., self.fase] = np.where(valido, self.gamma * (y - nivel) + (1 - self.gamma) * s, s)
+            self.fase = (self.fase + 1) % PERIODO_SAZONAL
+        self.nivel, self.tendencia = nivel, tendencia
+
+    def copiar(self):
+        return copy.deepcopy(self)
+
+    def atualizar(self, novo_mes):
+        """Inclui um novo mês (um valor por conta, na ordem do índice) no estado ajustado."""
+        if isinstance(novo_mes, pd.Series) and not novo_mes.index.equals(self.index):
+            novo_mes = novo_mes.reindex(self.index)
+        self._passo(np.asarray(novo_mes, dtype=float))
+        return self
+
+    def prever(self, horizonte):
+        """Projeção dos próximos `horizonte` meses: DataFrames (previsao, inferior, superior), colunas 1..horizonte."""
+        h = np.arange(1, horizonte + 1)
+        media = self.nivel[:, None] + h[None, :] * self.tendencia[:, None]
+        if self.sazonal is not None:
+            media = media + self.sazonal[:, (self.fase + h - 1) % PERIODO_SAZONAL]
+
+        # Variância do erro de h passos do modelo de Holt: sigma² (1 + Σ_{j<h} α²(1 + jβ)²)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            sigma2 = np.where(self.n_erros > 1, self.sse / self.n_erros, np.nan)
+        j = np.arange(horizonte)
+        termos = (self.alpha[:, None] * (1 + j[None, :] * self.beta[:, None])) ** 2
+        termos[:, 0] = 0.0
+        desvio = np.sqrt(sigma2[:, None] * (1 + np.cumsum(termos, axis=1)))
+
+        colunas = pd.RangeIndex(1, horizonte + 1)
+        criar = lambda m: pd.DataFrame(m, index=self.index, columns=colunas)  # noqa: E731
+        return criar(media), criar(media - Z_INTERVALO * desvio), criar(media + Z_INTERVALO * desvio)
+
+
+def rotulos_futuros(months, horizonte):
+    """Rótulos dos meses projetados, seguindo o formato dos meses da planilha quando possível."""
+    ultimo = months[-1] if months else None
+    if isinstance(ultimo, pd.Timestamp) or hasattr(ultimo, 'year') and hasattr(ultimo, 'month'):
+        return [pd.Timestamp(ultimo) + pd.DateOffset(months=i) for i in range(1, horizonte + 1)]
+    return [f"{ultimo} +{i}" for i in range(1, horizonte + 1)]
@@ -0,0 +1,417 @@
+# core/registro.py
+
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import time
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from core.anomalias import detectar_anomalias
+from core.cache_disco import hash_conteudo
+from core.consolidacao import alinhar_contas, opcoes_unidade, visao_unidade
+from core.diagnostico import calcular_analise, periodos_comuns
+from core.indice_periodo import IndicePeriodo
+from core.instrumentacao import anotar
+from core.kpis import PainelKpis
+from core.previa import PreviaFormatada
+from core.previsao import ModeloPrevisao
+
+REGISTRO_MAX_BYTES = int(float(os.environ.get("DASHPL_REGISTRO_MAX_MB", "2048")) * 1024 * 1024)
+PRECALCULO_WORKERS = int(os.environ.get("DASHPL_PRECALCULO_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Máximo de diagnósticos guardados por dataset (os mais antigos saem primeiro)
+MAX_ANALISES = 4096
+
+# Os rankings de anomalias ficam junto dos diagnósticos, com estes marcadores no lugar do grupo
+_ANOMALIAS = "__anomalias__"
+_ANOMALIAS_TODAS = "__anomalias_todas__"  # todas as unidades: depende de meses das outras unidades
+
+# Pool compartilhado para o pré-cálculo dos diagnósticos logo após o upload
+_EXECUTOR = ThreadPoolExecutor(max_workers=PRECALCULO_WORKERS, thread_name_prefix="precalculo")
+
+
+# --- ARMAZENAMENTO COMPACTO ---
+def compactar(df):
+    """Guarda os valores em um único bloco float32 quando isso não altera o que é exibido.
+
+    Percentuais (|v| < 1) precisam de erro < 0,00005 e valores em R$ de erro < 0,005.
+    Se algum valor não couber nessa precisão o bloco fica em float64, o que é o
+    esperado em planilhas com valores em R$ a partir de 131.072 (o float32 só tem
+    passo de 0,01 abaixo disso). Compactar por coluna não muda esse resultado: cada
+    coluna é um mês e tem as mesmas contas em R$ das outras.
+    """
+    valores = df.to_numpy(dtype=np.float64)
+    compacto = valores.astype(np.float32)
+    with np.errstate(invalid='ignore'):
+        erro = np.abs(compacto.astype(np.float64) - valores)
+        tolerancia = np.where(np.abs(valores) < 1, 5e-5, 5e-3)
+        cabe = np.all((erro <= tolerancia) | np.isnan(valores))
+    bloco = compacto if cabe else valores
+    novo = pd.DataFrame(bloco, index=df.index, columns=df.columns, copy=False)
+    novo.attrs = dict(df.attrs)
+    return novo
+
+
+def _tamanho(obj, vistos):
+    """Bytes ocupados por `obj` e pelos DataFrames/arrays que ele guarda (cada objeto contado uma vez)."""
+    if id(obj) in vistos:
+        return 0
+    vistos.add(id(obj))
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return int(obj.memory_usage(index=True, deep=True).sum())
+    if isinstance(obj, pd.Index):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray):
+        if obj.dtype == object:
+            return obj.nbytes + sum(map(sys.getsizeof, obj.ravel()))
+        return obj.nbytes
+    if isinstance(obj, dict):
+        return sum(_tamanho(v, vistos) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(_tamanho(v, vistos) for v in obj)
+    if hasattr(obj, '__dict__'):
+        return _tamanho(vars(obj), vistos)
+    return 0
+
+
+class _Entrada:
+    __slots__ = ('df', 'unidades', 'visoes', 'indices', 'analises', 'bytes_analises', 'modelos', 'kpis', 'previas',
+                 'tarefas', 'referencias', 'ultimo_uso')
+
+    def __init__(self, df):
+        self.df = df
+        self.unidades = opcoes_unidade(df)
+        self.visoes = {}
+        self.indices = {}
+        self.analises = {}
+        self.bytes_analises = 0  # somado a cada diagnóstico guardado, para não medir milhares a cada despejo
+        self.modelos = {}
+        self.kpis = {}
+        self.previas = {}
+        self.tarefas = []
+        self.referencias = 0
+        self.ultimo_uso = time.monotonic()
+
+    def nbytes(self):
+        # Visões, índices (com as tabelas esparsas), modelos, KPIs e prévias formatadas;
+        # objetos compartilhados (ex.: a visão dentro da prévia) contam uma vez só
+        vistos = set()
+        total = sum(_tamanho(parte, vistos) for parte in (self.df, self.visoes, self.indices, self.modelos,
+                                                          self.kpis, self.previas))
+        return total + self.bytes_analises
+
+    def guardar_analise(self, chave_analise, analise_df, tamanho):
+        if chave_analise in self.analises:
+            return self.analises[chave_analise]
+        if len(self.analises) >= MAX_ANALISES:
+            self.bytes_analises -= _tamanho(self.analises.pop(next(iter(self.analises))), set())
+        self.analises[chave_analise] = analise_df
+        self.bytes_analises += tamanho
+        return analise_df
+
+
+class Handle:
+    """Referência de uma sessão a um dataset do registro.
+
+    É o único objeto que a sessão precisa guardar. Enquanto existir, o dataset
+    não é despejado; quando é coletado, a referência é devolvida ao registro.
+    """
+
+    def __init__(self, registro, chave):
+        self.chave = chave
+        self._registro = registro
+        weakref.finalize(self, registro._liberar, chave)
+
+    @property
+    def df(self):
+        return self._registro._entrada(self.chave).df
+
+    @property
+    def unidades(self):
+        return self._registro._entrada(self.chave).unidades
+
+    def visao(self, unidade):
+        return self._registro._visao(self.chave, unidade)
+
+    def indice(self, unidade):
+        return self._registro._indice(self.chave, unidade)
+
+    def previa(self, unidade):
+        return self._registro._previa(self.chave, unidade)
+
+    def kpis(self, unidade):
+        return self._registro._kpis(self.chave, unidade)
+
+    def previsao(self, unidade):
+        return self._registro._previsao(self.chave, unidade)
+
+    def analise(self, unidade, grupo, faixa, inicio, fim):
+        return self._registro._analise(self.chave, unidade, grupo, faixa, inicio, fim)
+
+    def anomalias(self, unidade, todas_unidades, inicio, fim, grupos):
+        return self._registro._anomalias(self.chave, unidade, todas_unidades, inicio, fim, grupos)
+
+    def precalcular(self, grupos):
+        self._registro._precalcular(self.chave, grupos)
+
+    def anexar_meses(self, unidade, novos, chave_novos):
+        """Handle para um novo dataset com os meses de `novos` acrescentados à `unidade`."""
+        return self._registro._anexar(self.chave, unidade, novos, chave_novos)
+
+    def progresso(self):
+        return self._registro._progresso(self.chave)
+
+
+# --- REGISTRO DE DATASETS DO PROCESSO ---
+class RegistroDatasets:
+    """Datasets carregados, compartilhados por todas as sessões do servidor.
+
+    Cada planilha (ou conjunto de planilhas) é guardada uma única vez, pela
+    chave do hash do conteúdo, junto com as visões por unidade e os índices de
+    período. As sessões guardam apenas um Handle. Datasets sem nenhum Handle
+    vivo são despejados do menos usado para o mais usado quando o total passa
+    de `max_bytes`.
+    """
+
+    def __init__(self, max_bytes=REGISTRO_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entradas = {}
+        self._lock = threading.RLock()
+
+    def adquirir(self, chave):
+        """Handle para um dataset já registrado, ou None."""
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                return None
+            entrada.referencias += 1
+            entrada.ultimo_uso = time.monotonic()
+            return Handle(self, chave)
+
+    def registrar(self, chave, df):
+        with self._lock:
+            if chave not in self._entradas:
+                self._entradas[chave] = _Entrada(compactar(df))
+            handle = self.adquirir(chave)
+            self._despejar()
+            return handle
+
+    def _entrada(self, chave):
+        entrada = self._entradas[chave]
+        entrada.ultimo_uso = time.monotonic()
+        return entrada
+
+    def _visao(self, chave, unidade):
+        with self._lock:
+            entrada = self._entrada(chave)
+            if unidade not in entrada.visoes:
+                entrada.visoes[unidade] = visao_unidade(entrada.df, unidade)
+            return entrada.visoes[unidade]
+
+    def _indice(self, chave, unidade):
+        with self._lock:
+            entrada = self._entrada(chave)
+            if unidade not in entrada.indices:
+                entrada.indices[unidade] = IndicePeriodo(self._visao(chave, unidade))
+            return entrada.indices[unidade]
+
+    def _previa(self, chave, unidade):
+        with self._lock:
+            entrada = self._entrada(chave)
+            if unidade not in entrada.previas:
+                entrada.previas[unidade] = PreviaFormatada(self._visao(chave, unidade))
+            return entrada.previas[unidade]
+
+    def _kpis(self, chave, unidade):
+        # Resolvido e validado uma vez por unidade; o erro de layout também fica guardado
+        with self._lock:
+            entrada = self._entrada(chave)
+            anotar(cache='hit' if unidade in entrada.kpis else 'miss')
+            if unidade not in entrada.kpis:
+                try:
+                    entrada.kpis[unidade] = PainelKpis(self._visao(chave, unidade))
+                except ValueError as e:
+                    entrada.kpis[unidade] = e
+            resultado = entrada.kpis[unidade]
+        if isinstance(resultado, Exception):
+            raise resultado
+        return resultado
+
+    def _previsao(self, chave, unidade):
+        # Modelos ajustados uma vez por unidade, no histórico completo
+        with self._lock:
+            entrada = self._entrada(chave)
+            pronto = entrada.modelos.get(unidade)
+            anotar(cache='hit' if pronto is not None else 'miss')
+            if pronto is not None:
+                return pronto
+            df = self._visao(chave, unidade)
+        # O ajuste fica fora do lock, como no _analise
+        modelo = ModeloPrevisao.ajustar(df)
+        with self._lock:
+            return entrada.modelos.setdefault(unidade, modelo)
+
+    def _analise(self, chave, unidade, grupo, faixa, inicio, fim):
+        chave_analise = (unidade, grupo, inicio, fim)
+        with self._lock:
+            entrada = self._entrada(chave)
+            pronta = entrada.analises.get(chave_analise)
+            anotar(cache='hit' if pronta is not None else 'miss')
+            if pronta is not None:
+                return pronta
+            df, indice = self._visao(chave, unidade), self._indice(chave, unidade)
+        # O cálculo em si fica fora do lock para não bloquear as outras sessões
+        analise_df = calcular_analise(df, indice, faixa, inicio, fim)
+        tamanho = _tamanho(analise_df, set())
+        with self._lock:
+            return entrada.guardar_analise(chave_analise, analise_df, tamanho)
+
+    def _anomalias(self, chave, unidade, todas_unidades, inicio, fim, grupos):
+        """Ranking de anomalias dos meses `inicio`..`fim` da visão `unidade` (ou de todas as unidades nesses meses).
+
+        Compartilhado entre as sessões, como os diagnósticos: mudar só o Top N na
+        página não recalcula, e cada sessão não guarda a própria cópia.
+        """
+        chave_analise = (unidade, _ANOMALIAS_TODAS if todas_unidades else _ANOMALIAS, inicio, fim)
+        with self._lock:
+            entrada = self._entrada(chave)
+            pronta = entrada.analises.get(chave_analise)
+            anotar(cache='hit' if pronta is not None else 'miss')
+            if pronta is not None:
+                return pronta
+            df = self._visao(chave, unidade).iloc[:, inicio:fim + 1]
+            if todas_unidades:
+                df = entrada.df[[m for m in df.columns if m in entrada.df.columns]]
+        ranking = detectar_anomalias(df, grupos)
+        tamanho = _tamanho(ranking, set())
+        with self._lock:
+            return entrada.guardar_analise(chave_analise, ranking, tamanho)
+
+    def _anexar(self, chave, unidade, novos, chave_novos):
+        """Registra o dataset `chave` com novos meses, reaproveitando o que não depende deles.
+
+        `novos` tem uma coluna por mês novo e as contas da `unidade` nas linhas.
+        Um mês que outra unidade já tem é gravado na coluna existente; só é
+        recusado se a própria `unidade` já tiver valores nele. As visões,
+        índices, modelos e diagnósticos já calculados são estendidos só com as
+        colunas novas quando elas ficam no fim da visão; diagnósticos de
+        períodos que terminam antes dos meses novos continuam válidos e são mantidos.
+        """
+        with self._lock:
+            antiga = self._entrada(chave)
+        df = antiga.df
+        linhas = df.index.get_level_values('unidade') == unidade
+        existentes = [m for m in novos.columns if m in df.columns]
+        repetidos = [m for m in existentes if df.loc[linhas, m].notna().any()]
+        if repetidos:
+            raise ValueError(f"O(s) mês(es) {', '.join(map(str, repetidos))} já existe(m) em {unidade}.")
+
+        alinhados = alinhar_contas(df.index[linhas].droplevel('unidade'), novos)
+        if alinhados.isna().all().all():
+            raise ValueError("A planilha nova não tem valores para as contas dessa unidade.")
+
+        bloco = np.full((len(df), novos.shape[1]), np.nan)
+        bloco[linhas] = alinhados.to_numpy(dtype=float)
+        meses_novos = compactar(pd.DataFrame(bloco, index=df.index, columns=novos.columns))
+        # Um único tipo no dataset inteiro: o bloco novo segue o existente, a não ser que
+        # precise de float64 (aí o dataset todo passa a float64, sem perder precisão)
+        tipo = np.result_type(*df.dtypes.unique(), *meses_novos.dtypes.unique())
+        meses_novos, df = meses_novos.astype(tipo), df.astype(tipo)
+        if existentes:
+            # Os valores da unidade entram nas colunas que as outras unidades já têm
+            # (copy-on-write: o dataset antigo não é alterado)
+            df.loc[linhas, existentes] = meses_novos.loc[linhas, existentes]
+        df_novo = pd.concat([df, meses_novos.drop(columns=existentes)], axis=1)
+        df_novo.attrs = dict(antiga.df.attrs)
+        nova_chave = hash_conteudo((chave + unidade + chave_novos).encode())
+
+        posicao_mes = {m: i for i, m in enumerate(df_novo.columns)}
+        with self._lock:
+            if nova_chave not in self._entradas:
+                nova = _Entrada(df_novo)
+                for u, visao in antiga.visoes.items():
+                    # Meses que passam a existir nesta visão (nos consolidados, os que agora todas as unidades têm)
+                    extra = visao_unidade(df_novo[list(novos.columns)], u)
+                    extra = extra.loc[:, ~extra.columns.isin(visao.columns)]
+                    if extra.shape[1] == 0:
+                        # Visão sem meses novos: tudo continua valendo
+                        nova.visoes[u] = visao
+                        for origem, destino in ((antiga.indices, nova.indices), (antiga.modelos, nova.modelos)):
+                            if u in origem:
+                                destino[u] = origem[u]
+                        for k, v in antiga.analises.items():
+                            if k[0] == u and k[1] != _ANOMALIAS_TODAS:
+                                nova.guardar_analise(k, v, _tamanho(v, set()))
+                        continue
+                    if visao.shape[1] and min(map(posicao_mes.get, extra.columns)) < max(map(posicao_mes.get, visao.columns)):
+                        continue  # mês no meio da visão: ela é recalculada quando for pedida
+                    nova.visoes[u] = pd.concat([visao.astype(tipo), extra], axis=1)
+                    if u in antiga.indices:
+                        nova.indices[u] = antiga.indices[u].anexar(extra)
+                    if u in antiga.modelos:
+                        modelo = antiga.modelos[u].copiar()
+                        for mes in extra.columns:
+                            modelo.atualizar(extra[mes])
+                        nova.modelos[u] = modelo
+                    n_meses = visao.shape[1]
+                    for k, v in antiga.analises.items():
+                        if k[0] == u and k[1] != _ANOMALIAS_TODAS and k[3] < n_meses:
+                            nova.guardar_analise(k, v, _tamanho(v, set()))
+                self._entradas[nova_chave] = nova
+            handle = self.adquirir(nova_chave)
+            self._despejar()
+            return handle
+
+    def _precalcular(self, chave, grupos):
+        """Agenda, em segundo plano, os diagnósticos de todos os grupos e unidades nos períodos comuns.
+
+        Cada (unidade, grupo, período) é uma tarefa, para o progresso andar
+        mesmo quando há uma unidade só.
+        """
+        with self._lock:
+            entrada = self._entrada(chave)
+            if entrada.tarefas:
+                return
+            for unidade in entrada.unidades:
+                n_meses = self._visao(chave, unidade).shape[1]
+                for inicio, fim in periodos_comuns(n_meses):
+                    for grupo, faixa in grupos.items():
+                        entrada.tarefas.append(_EXECUTOR.submit(
+                            self._precalcular_analise, chave, unidade, grupo, faixa, inicio, fim))
+
+    def _precalcular_analise(self, chave, unidade, grupo, faixa, inicio, fim):
+        try:
+            self._analise(chave, unidade, grupo, faixa, inicio, fim)
+        except KeyError:
+            pass  # dataset despejado durante o pré-cálculo
+
+    def _progresso(self, chave):
+        """(diagnósticos concluídos, total de diagnósticos) do pré-cálculo."""
+        with self._lock:
+            tarefas = self._entradas[chave].tarefas
+            return sum(t.done() for t in tarefas), len(tarefas)
+
+    def _liberar(self, chave):
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is not None:
+                entrada.referencias -= 1
+                self._despejar()
+
+    def _despejar(self):
+        total = sum(e.nbytes() for e in self._entradas.values())
+        livres = sorted((e.ultimo_uso, c) for c, e in self._entradas.items() if e.referencias <= 0)
+        for _, chave in livres:
+            if total <= self.max_bytes:
+                break
+            total -= self._entradas.pop(chave).nbytes()
+
+    def __len__(self):
+        return len(self._entradas)
+
+
+REGISTRO = RegistroDatasets()
@@ -0,0 +1,139 @@
+# core/relatorio.py
+
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from core.anomalias import detectar_anomalias
+from core.consolidacao import opcoes_unidade, visao_unidade
+from core.dados import GRUPOS
+from core.diagnostico import CRITERIOS, calcular_analise, pontos_de_atencao
+from core.indice_periodo import IndicePeriodo
+from core.kpis import LayoutInvalido, PainelKpis, formatar_kpi
+
+FORMATOS = ('xlsx', 'html')
+
+
+# --- TABELAS DO RELATÓRIO (as mesmas contas das páginas, sem Streamlit) ---
+def tabela_kpis(df):
+    """KPIs do resumo da página principal para todos os meses, uma linha por (mês, KPI)."""
+    painel = PainelKpis(df)
+    n_kpis, n_meses = painel.valores.shape
+    anterior = np.hstack([np.full((n_kpis, 1), np.nan), painel.valores[:, :-1]])
+    return pd.DataFrame({
+        'Mês': np.tile(painel.months, n_kpis),
+        'KPI': np.repeat([painel.rotulos[c] for c in painel.chaves], n_meses),
+        'Formato': np.repeat([painel.formatos[c] for c in painel.chaves], n_meses),
+        'Valor': painel.valores.ravel(),
+        'Mês Anterior': anterior.ravel(),
+        'Variação Mensal': painel.delta_mensal.ravel(),
+        'Média Histórica': painel.media_historica.ravel(),
+        'Variação vs. Média': painel.delta_historico.ravel(),
+    })
+
+
+def tabela_diagnostico(df, grupos, top_n):
+    """Top N do diagnóstico automático de cada grupo e critério, com o período terminando em cada mês."""
+    indice = IndicePeriodo(df)
+    linhas = []
+    for fim in range(1, df.shape[1]):
+        for grupo, faixa in grupos.items():
+            if faixa[0] >= len(df):
+                continue
+            analise_df = calcular_analise(df, indice, faixa, 0, fim)
+            for criterio, (coluna, _, _) in CRITERIOS.items():
+                top = pontos_de_atencao(analise_df, criterio, top_n)
+                for posicao, (conta, valor, ultimo, media) in enumerate(
+                        zip(top.index, top[coluna], top['ultimo_valor'], top['media_historica']), start=1):
+                    linhas.append((df.columns[fim], grupo, criterio, posicao, conta, valor, ultimo, media))
+    return pd.DataFrame(linhas, columns=['Mês', 'Grupo', 'Critério', 'Posição', 'Conta',
+                                         'Valor do Critério', 'Último Valor', 'Média Histórica'])
+
+
+def tabela_anomalias(df, grupos, top_n):
+    """Top N das anomalias de todos os grupos avaliadas em cada mês (a partir do segundo)."""
+    partes = []
+    for fim in range(1, df.shape[1]):
+        piores = detectar_anomalias(df.iloc[:, :fim + 1], grupos).head(top_n)
+        partes.append(piores.rename_axis('Conta').reset_index().assign(**{'Mês': df.columns[fim]}))
+    if not partes:
+        return pd.DataFrame()
+    tabela = pd.concat(partes, ignore_index=True)
+    return tabela[['Mês'] + [c for c in tabela.columns if c != 'Mês']]
+
+
+def relatorio_unidade(df, grupos=GRUPOS, top_n=5):
+    """Tabelas do relatório de uma unidade e a lista de avisos (ex.: layout dos KPIs inválido)."""
+    tabelas, avisos = {}, []
+    try:
+        tabelas['KPIs'] = tabela_kpis(df)
+    except LayoutInvalido as e:
+        avisos.append(f"KPIs não calculados: {e}")
+    tabelas['Diagnóstico'] = tabela_diagnostico(df, grupos, top_n)
+    tabelas['Anomalias'] = tabela_anomalias(df, grupos, top_n)
+    return tabelas, avisos
+
+
+# --- GRAVAÇÃO ---
+def _nome_arquivo(unidade):
+    return re.sub(r'[^\w\-(). ]', '_', unidade).strip() or "unidade"
+
+
+def _html(unidade, tabelas, avisos):
+    partes = [f"<html><head><meta charset='utf-8'><title>{unidade}</title></head><body>", f"<h1>{unidade}</h1>"]
+    partes += [f"<p><strong>Aviso:</strong> {aviso}</p>" for aviso in avisos]
+    for titulo, tabela in tabelas.items():
+        if titulo == 'KPIs':
+            # Valores formatados como no painel (%, R$ ou número) conforme o formato de cada KPI
+            tabela = tabela.copy()
+            for coluna in ['Valor', 'Mês Anterior', 'Variação Mensal', 'Média Histórica', 'Variação vs. Média']:
+                tabela[coluna] = [formatar_kpi(v, f) for v, f in zip(tabela[coluna], tabela['Formato'])]
+            tabela = tabela.drop(columns='Formato')
+        partes.append(f"<h2>{titulo}</h2>")
+        partes.append(tabela.to_html(index=False, float_format="{:,.2f}".format, na_rep="-"))
+    partes.append("</body></html>")
+    return "\n".join(partes)
+
+
+def gravar_relatorio(unidade, tabelas, avisos, destino, formatos=FORMATOS):
+    """Grava o relatório de uma unidade em `destino` e retorna os caminhos gerados."""
+    os.makedirs(destino, exist_ok=True)
+    base = os.path.join(destino, _nome_arquivo(unidade))
+    caminhos = []
+    if 'xlsx' in formatos:
+        with pd.ExcelWriter(base + ".xlsx", engine="openpyxl") as writer:
+            for titulo, tabela in tabelas.items():
+                tabela.to_excel(writer, sheet_name=titulo, index=False)
+            if avisos:
+                pd.DataFrame({'Aviso': avisos}).to_excel(writer, sheet_name="Avisos", index=False)
+        caminhos.append(base + ".xlsx")
+    if 'html' in formatos:
+        with open(base + ".html", "w", encoding="utf-8") as f:
+            f.write(_html(unidade, tabelas, avisos))
+        caminhos.append(base + ".html")
+    return caminhos
+
+
+def _gerar_unidade(args):
+    unidade, df, grupos, destino, formatos, top_n = args
+    tabelas, avisos = relatorio_unidade(df, grupos, top_n)
+    return unidade, gravar_relatorio(unidade, tabelas, avisos, destino, formatos), avisos
+
+
+# --- TODAS AS UNIDADES EM PARALELO ---
+def gerar_relatorios(df_consolidado, destino, formatos=FORMATOS, top_n=5, grupos=GRUPOS, max_workers=None):
+    """Gera um relatório por unidade (e pelos consolidados, se houver mais de uma), um processo por unidade.
+
+    Retorna uma lista de (unidade, caminhos gerados, avisos), na ordem das unidades.
+    """
+    tarefas = [(unidade, visao_unidade(df_consolidado, unidade), grupos, destino, formatos, top_n)
+               for unidade in opcoes_unidade(df_consolidado)]
+    if len(tarefas) <= 1:
+        return list(map(_gerar_unidade, tarefas))
+
+    max_workers = max_workers or min(len(tarefas), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(_gerar_unidade, tarefas))
@@ -0,0 +1,52 @@
+# core/tendencia.py
+
+import numpy as np
+import pandas as pd
+
+
+# --- REGRESSÃO LINEAR VETORIZADA (IGNORANDO NaN) ---
+def ajustar_tendencias(df):
+    """Ajusta y = a + b*x para todas as linhas de `df` em uma única operação matricial.
+
+    Reproduz o ajuste por linha antigo (LinearRegression sobre `row.dropna()`):
+    os valores ausentes são descartados e `x` é a posição do valor entre os
+    válidos da linha (0, 1, 2, ...), e não a posição original do mês.
+    Linhas com menos de 2 valores válidos recebem inclinação 0.0.
+
+    Retorna um DataFrame com as colunas 'inclinacao', 'intercepto', 'r2' e 'n'.
+    """
+    y = df.to_numpy(dtype=float)
+    mask = ~np.isnan(y)
+    n = mask.sum(axis=1)
+
+    # Posição de cada valor válido entre os válidos da linha
+    x = np.where(mask, np.cumsum(mask, axis=1) - 1, 0).astype(float)
+    y0 = np.where(mask, y, 0.0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        x_mean = (n - 1) / 2.0
+        y_mean = y0.sum(axis=1) / n
+        dx = np.where(mask, x - x_mean[:, None], 0.0)
+        dy = np.where(mask, y0 - y_mean[:, None], 0.0)
+        sxx = (dx * dx).sum(axis=1)
+        sxy = (dx * dy).sum(axis=1)
+        syy = (dy * dy).sum(axis=1)
+
+        inclinacao = sxy / sxx
+        intercepto = y_mean - inclinacao * x_mean
+        r2 = np.where(syy > 0, (sxy * sxy) / (sxx * syy), np.nan)
+
+    poucos = n < 2
+    inclinacao[poucos] = 0.0
+    intercepto[poucos] = np.nan
+    r2[poucos] = np.nan
+
+    return pd.DataFrame(
+        {'inclinacao': inclinacao, 'intercepto': intercepto, 'r2': r2, 'n': n},
+        index=df.index
+    )
+
+
+def calcular_tendencia(df):
+    """Inclinação (crescimento por mês) de cada linha de `df`."""
+    return ajustar_tendencias(df)['inclinacao']
@@ -0,0 +1,38 @@
+# core/texto.py
+
+import re
+import unicodedata
+
+
+def normalizar(texto):
+    """Texto sem acentos e em minúsculas, para comparar nomes de contas e rótulos de meses."""
+    sem_acento = unicodedata.normalize('NFKD', str(texto)).encode('ascii', 'ignore').decode()
+    return sem_acento.lower()
+
+
+_MESES = {'jan': 1, 'fev': 2, 'mar': 3, 'abr': 4, 'mai': 5, 'jun': 6,
+          'jul': 7, 'ago': 8, 'set': 9, 'out': 10, 'nov': 11, 'dez': 12}
+
+
+def mes_absoluto(rotulo):
+    """Número do mês (ano * 12 + mês - 1) a partir do rótulo da coluna, ou None se não reconhecer.
+
+    Aceita datas e textos como "2024-03", "03/2024", "mar/24", "Março 2024" e "202403".
+    """
+    if hasattr(rotulo, 'year') and hasattr(rotulo, 'month'):
+        return int(rotulo.year) * 12 + int(rotulo.month) - 1
+    texto = normalizar(rotulo).strip()
+    if m := re.fullmatch(r'(\d{4})[-/.](\d{1,2})(?:[-/.]\d{1,2})?(?:[ t].*)?', texto):
+        ano, mes = int(m[1]), int(m[2])
+    elif m := re.fullmatch(r'(\d{1,2})[-/.](\d{4})', texto):
+        mes, ano = int(m[1]), int(m[2])
+    elif m := re.fullmatch(r'(\d{4})(\d{2})', texto):
+        ano, mes = int(m[1]), int(m[2])
+    elif (m := re.fullmatch(r'([a-z]{3})[a-z]*\.?[\s/\-.]*(?:de\s+)?(\d{2}|\d{4})', texto)) and m[1] in _MESES:
+        mes, ano = _MESES[m[1]], int(m[2])
+        ano += 2000 if ano < 100 else 0
+    else:
+        return None
+    if not 1 <= mes <= 12:
+        return None
+    return ano * 12 + mes - 1
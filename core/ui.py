@@ -0,0 +1,205 @@
+# core/ui.py
+# Componentes do Streamlit compartilhados entre o app principal e as páginas.
+
+import functools
+import json
+from contextlib import contextmanager
+
+import pandas as pd
+import streamlit as st
+
+from core import instrumentacao
+from core.historico import HISTORICO, meses_nao_reconhecidos
+from core.instrumentacao import MODOS, MODOS_AMBIENTE
+
+# Execuções guardadas na sessão para o painel e a exportação
+MAX_HISTORICO_METRICAS = 50
+
+# Segundos entre as atualizações da barra de pré-cálculo
+INTERVALO_PROGRESSO = 1.0
+
+
+def selecionar_unidade():
+    """Seletor de unidade na sidebar; atualiza df, months e indice na sessão.
+
+    A escolha fica em st.session_state.unidade e vale para todas as páginas.
+    As visões e índices vêm do registro compartilhado (st.session_state.dataset).
+    """
+    dataset = st.session_state.dataset
+    opcoes = dataset.unidades
+    atual = st.session_state.get('unidade')
+    if atual not in opcoes:
+        atual = opcoes[0]
+    if len(opcoes) > 1:
+        with st.sidebar:
+            atual = st.selectbox("🏬 Unidade", options=opcoes, index=opcoes.index(atual))
+    st.session_state.unidade = atual
+
+    df = dataset.visao(atual)
+    st.session_state.df, st.session_state.months = df, df.columns.tolist()
+    st.session_state.indice = dataset.indice(atual)
+    return df
+
+
+def mostrar_progresso_precalculo():
+    """Barra de progresso na sidebar enquanto os diagnósticos são pré-calculados.
+
+    A barra é um fragmento que se redesenha sozinho a cada INTERVALO_PROGRESSO
+    segundos, sem esperar uma interação; só é criada enquanto há trabalho pendente.
+    """
+    concluidas, total = st.session_state.dataset.progresso()
+    if total and concluidas < total:
+        with st.sidebar:
+            _barra_precalculo()
+
+
+@st.fragment(run_every=INTERVALO_PROGRESSO)
+def _barra_precalculo():
+    concluidas, total = st.session_state.dataset.progresso()
+    if concluidas >= total:
+        st.rerun()  # execução completa: a barra sai da página e para de se atualizar
+    st.progress(concluidas / total, text=f"Pré-calculando diagnósticos ({concluidas}/{total})...")
+
+
+# --- GRAVAÇÕES NO HISTÓRICO LOCAL ---
+def gravar_historico(df, chave, nome, nova_lista=False):
+    """Grava `df` no histórico local em segundo plano e guarda na sessão o que avisar sobre a gravação.
+
+    Os rótulos de mês não reconhecidos já são conhecidos aqui; uma falha do
+    SQLite só aparece quando o Future termina, em uma execução seguinte.
+    `nova_lista` descarta os avisos das gravações anteriores (outro upload).
+    """
+    gravacao = {
+        'nome': nome,
+        'futuro': HISTORICO.gravar_em_segundo_plano(df, chave, nome),
+        'ignorados': meses_nao_reconhecidos(df.columns),
+        'colunas': df.shape[1],
+    }
+    if nova_lista:
+        st.session_state.gravacoes_historico = []
+    st.session_state.setdefault('gravacoes_historico', []).append(gravacao)
+
+
+def mostrar_avisos_historico():
+    """Avisos sobre o que não entrou no histórico local (e, portanto, nos comparativos entre anos)."""
+    for gravacao in st.session_state.get('gravacoes_historico', []):
+        nome, futuro, ignorados = gravacao['nome'], gravacao['futuro'], gravacao['ignorados']
+        amostra = ", ".join(ignorados[:5]) + (", ..." if len(ignorados) > 5 else "")
+        if futuro.done() and futuro.result() is None:
+            st.warning(f"Não foi possível gravar `{nome}` no histórico local.")
+        elif ignorados and len(ignorados) == gravacao['colunas']:
+            st.warning(f"Nada de `{nome}` foi gravado no histórico local: nenhuma coluna tem mês e ano "
+                       f"reconhecíveis ({amostra}). Use rótulos como 2024-01 ou jan/24.")
+        elif ignorados:
+            st.warning(f"{len(ignorados)} coluna(s) de `{nome}` sem mês e ano reconhecíveis não foram "
+                       f"gravadas no histórico local ({amostra}).")
+
+
+# --- INSTRUMENTAÇÃO (tempos por seção) ---
+def modos_metricas():
+    """Modos de instrumentação ativos na sessão: DASHPL_METRICAS mais ?metricas=... na URL.
+
+    O pedido pela URL fica guardado na sessão e vale nas outras páginas;
+    ?metricas= (vazio) desliga.
+    """
+    pedido = st.query_params.get('metricas')
+    if pedido is not None:
+        st.session_state.metricas_modos = frozenset(m.strip() for m in pedido.split(",") if m.strip() in MODOS)
+    return MODOS_AMBIENTE | st.session_state.get('metricas_modos', frozenset())
+
+
+def iniciar_metricas(pagina):
+    """Começa a medir as seções desta execução da página, se a instrumentação estiver ligada."""
+    modos = modos_metricas()
+    if not modos:
+        return
+    perfil = 'perfil' in modos or st.session_state.pop('metricas_perfil_proxima', False)
+    instrumentacao.iniciar(pagina, log='log' in modos, perfil=perfil)
+
+
+def _guardar_execucao(coletor):
+    historico = st.session_state.setdefault('metricas_historico', [])
+    historico.append(coletor.como_dict())
+    del historico[:-MAX_HISTORICO_METRICAS]
+    if coletor.perfil is not None:
+        st.session_state.metricas_perfil = (coletor.pagina, coletor.perfil.principais(), coletor.perfil.pilhas_colapsadas())
+
+
+def medir_fragmento(nome):
+    """Mede um fragmento como a seção `nome`.
+
+    Dentro da execução completa da página vira uma seção dela; quando só o
+    fragmento é reexecutado, a execução do fragmento é registrada sozinha.
+    Usar abaixo do @st.fragment.
+    """
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def executar(*args, **kwargs):
+            if instrumentacao.atual() is not None or not modos_metricas():
+                with instrumentacao.secao(nome):
+                    return funcao(*args, **kwargs)
+            iniciar_metricas(f"fragmento {nome}")
+            try:
+                with instrumentacao.secao(nome):
+                    return funcao(*args, **kwargs)
+            finally:
+                _guardar_execucao(instrumentacao.finalizar())
+        return executar
+    return decorador
+
+
+@contextmanager
+def medir_pagina(pagina):
+    """Mede o corpo da página: iniciar_metricas na entrada e finalizar_metricas na saída.
+
+    Se a execução for interrompida (st.rerun, st.stop, um clique que reinicia
+    o script ou um erro), a coleta é encerrada e guardada mesmo assim, sem o painel.
+    """
+    iniciar_metricas(pagina)
+    try:
+        yield
+    except BaseException:
+        coletor = instrumentacao.finalizar()
+        if coletor is not None:
+            _guardar_execucao(coletor)
+        raise
+    finalizar_metricas()
+
+
+def finalizar_metricas():
+    """Encerra a medição da execução e, no modo "painel", mostra os tempos na sidebar."""
+    coletor = instrumentacao.finalizar()
+    if coletor is None:
+        return
+    _guardar_execucao(coletor)
+    if 'painel' in modos_metricas():
+        _painel_metricas(coletor)
+
+
+def _painel_metricas(coletor):
+    with st.sidebar.expander(f"⏱️ Tempos desta execução ({coletor.duracao_ms:,.0f} ms)"):
+        linhas = []
+        for registro in sorted(coletor.registros, key=lambda r: r['inicio_ms']):
+            extras = {k: v for k, v in registro.items() if k not in ('secao', 'duracao_ms', 'nivel', 'inicio_ms')}
+            linhas.append({
+                'Seção': "\u2003" * registro['nivel'] + registro['secao'].rsplit("/", 1)[-1],
+                'ms': registro['duracao_ms'],
+                'Detalhes': ", ".join(f"{k}={v}" for k, v in extras.items()),
+            })
+        st.dataframe(pd.DataFrame(linhas), hide_index=True, use_container_width=True,
+                     column_config={'ms': st.column_config.NumberColumn(format="%.1f")})
+
+        historico = st.session_state.get('metricas_historico', [])
+        st.download_button("Exportar métricas (JSON lines)", "\n".join(json.dumps(h, ensure_ascii=False, default=str) for h in historico),
+                           file_name="dashpl_metricas.jsonl", mime="application/x-ndjson", key="metricas_exportar")
+
+        if st.button("Perfilar a próxima execução", key="metricas_perfilar"):
+            st.session_state.metricas_perfil_proxima = True
+            st.rerun()
+        perfil = st.session_state.get('metricas_perfil')
+        if perfil is not None:
+            pagina, principais, colapsadas = perfil
+            st.caption(f"Perfil amostrado de '{pagina}' (funções mais vistas no topo da pilha):")
+            st.dataframe(pd.DataFrame(principais, columns=['Função', '% próprio', '% total']), hide_index=True,
+                         use_container_width=True, column_config={c: st.column_config.NumberColumn(format="%.1f") for c in ('% próprio', '% total')})
+            st.download_button("Baixar pilhas (flamegraph)", colapsadas, file_name="dashpl_perfil.txt", key="metricas_perfil_baixar")
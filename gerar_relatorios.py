@@ -0,0 +1,39 @@
+# gerar_relatorios.py
+"""Gera os relatórios de KPIs e diagnósticos de todas as unidades, sem abrir o dashboard.
+
+Uso:
+    python gerar_relatorios.py loja_a.xlsx loja_b.xlsx --saida relatorios --formatos xlsx html --top-n 5
+"""
+
+import argparse
+import sys
+
+from core.consolidacao import arquivos_por_unidade, carregar_varias, consolidar
+from core.relatorio import FORMATOS, gerar_relatorios
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Relatórios em lote (KPIs, diagnóstico e anomalias) por unidade.")
+    parser.add_argument("planilhas", nargs="+", help="Planilhas Excel, uma por unidade")
+    parser.add_argument("--saida", default="relatorios", help="Pasta de destino (padrão: relatorios)")
+    parser.add_argument("--formatos", nargs="+", choices=FORMATOS, default=list(FORMATOS))
+    parser.add_argument("--top-n", type=int, default=5, help="Contas por critério no diagnóstico e nas anomalias")
+    parser.add_argument("--workers", type=int, default=None, help="Processos em paralelo (padrão: um por unidade, até o nº de CPUs)")
+    args = parser.parse_args(argv)
+
+    # Mesma leitura do load_data do app: planilhas em paralelo, empilhadas por unidade
+    arquivos = []
+    for caminho in args.planilhas:
+        with open(caminho, "rb") as f:
+            arquivos.append((caminho, f.read()))
+    df = consolidar(carregar_varias(arquivos_por_unidade(arquivos), max_workers=args.workers))
+
+    for unidade, caminhos, avisos in gerar_relatorios(df, args.saida, args.formatos, args.top_n, max_workers=args.workers):
+        print(f"{unidade}: {', '.join(caminhos)}")
+        for aviso in avisos:
+            print(f"  aviso: {aviso}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
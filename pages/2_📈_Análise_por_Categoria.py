@@ -1,97 +1,148 @@
 # pages/2_📈_Análise_por_Categoria.py
 
+import sqlite3
+
 import streamlit as st
 import pandas as pd
 import plotly.express as px
+from core.graficos import FIGURAS, modo_renderizacao
+from core.historico import HISTORICO, unidades_da_visao
+from core.instrumentacao import secao
+from core.ui import medir_pagina, selecionar_unidade
 
 st.set_page_config(layout="wide")
 st.title("📈 Análise Detalhada por Categoria")
 
-if 'df' not in st.session_state:
+if st.session_state.get('dataset') is None:
     st.error("Por favor, faça o upload de um arquivo na página principal primeiro.")
     st.stop()
 
-# Recupera os dados
-df = st.session_state.df
-months = st.session_state.months
-grupos = st.session_state.grupos
-
-# --- FILTROS NA SIDEBAR com st.select_slider ---
-with st.sidebar:
-    st.header("Filtros de Período")
-    start_month, end_month = st.select_slider(
-        "Selecione o intervalo de meses",
-        options=months,
-        value=(months[0], months[-1]),
-        key="categoria_slider"
-    )
-
-start_month_idx = months.index(start_month)
-end_month_idx = months.index(end_month)
-selected_months = months[start_month_idx:end_month_idx + 1]
-df_filtered = df[selected_months]
-
-# --- SELEÇÃO DE CATEGORIA ---
-st.header(f"Selecione uma Categoria para Análise (Período: {start_month} a {end_month})")
-
-col1, col2 = st.columns(2)
-with col1:
-    grupo_selecionado = st.selectbox("1. Escolha o Grupo", list(grupos.keys()))
-    start_idx, end_idx = grupos[grupo_selecionado]
-    df_grupo = df.iloc[start_idx:min(end_idx + 1, len(df))]
-with col2:
-    if not df_grupo.empty:
-        categoria_selecionada = st.selectbox("2. Escolha a Categoria", df_grupo.index)
-    else:
-        categoria_selecionada = None
+with medir_pagina("📈 Análise por Categoria"):
+    with secao("selecionar_unidade"):
+        selecionar_unidade()
+
+    # Recupera os dados
+    df = st.session_state.df
+    months = st.session_state.months
+    grupos = st.session_state.grupos
+
+    # --- FILTROS NA SIDEBAR com st.select_slider ---
+    with st.sidebar:
+        st.header("Filtros de Período")
+        start_month, end_month = st.select_slider(
+            "Selecione o intervalo de meses",
+            options=months,
+            value=(months[0], months[-1]),
+            key="categoria_slider"
+        )
+
+    start_month_idx = months.index(start_month)
+    end_month_idx = months.index(end_month)
+    selected_months = months[start_month_idx:end_month_idx + 1]
+    df_filtered = df[selected_months]
 
-st.markdown("---")
-if categoria_selecionada:
-    st.header(f"Análise da Categoria: '{categoria_selecionada}'")
+    # --- SELEÇÃO DE CATEGORIA ---
+    st.header(f"Selecione uma Categoria para Análise (Período: {start_month} a {end_month})")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        grupo_selecionado = st.selectbox("1. Escolha o Grupo", list(grupos.keys()))
+        start_idx, end_idx = grupos[grupo_selecionado]
+        df_grupo = df.iloc[start_idx:min(end_idx + 1, len(df))]
+    with col2:
+        if not df_grupo.empty:
+            categoria_selecionada = st.selectbox("2. Escolha a Categoria", df_grupo.index)
+        else:
+            categoria_selecionada = None
+
+    st.markdown("---")
+    if categoria_selecionada:
+        st.header(f"Análise da Categoria: '{categoria_selecionada}'")
     
-    data_categoria = df_filtered.loc[categoria_selecionada]
+        data_categoria = df_filtered.loc[categoria_selecionada]
     
-    # Detecção inteligente de formato (percentual vs número)
-    is_percent = '%' in categoria_selecionada or (data_categoria.abs().max() < 2 and data_categoria.abs().max() != 0)
-
-    def format_kpi_value(value):
-        if is_percent: return f"{value:.2%}"
-        return f"{value:,.2f}"
-
-    # --- MÉTRICAS COM O NOVO KPI DE "ÚLTIMO MÊS" ---
-    st.subheader("Métricas no Período Selecionado")
-    kpi1, kpi2, kpi3, kpi4 = st.columns(4) # Adicionada uma quarta coluna
-
-    kpi1.metric(label="Média", value=format_kpi_value(data_categoria.mean()))
-    kpi2.metric(label=f"Mínimo (em {data_categoria.idxmin()})", value=format_kpi_value(data_categoria.min()))
-    kpi3.metric(label=f"Máximo (em {data_categoria.idxmax()})", value=format_kpi_value(data_categoria.max()))
-
-    # Lógica para o KPI "Último Mês vs Mês Anterior"
-    if len(selected_months) >= 2:
-        ultimo_mes_valor = data_categoria.iloc[-1]
-        penultimo_mes_valor = data_categoria.iloc[-2]
-        delta = ultimo_mes_valor - penultimo_mes_valor
-        kpi4.metric(label=f"Último Mês ({selected_months[-1]})",
-                    value=format_kpi_value(ultimo_mes_valor),
-                    delta=format_kpi_value(delta),
-                    delta_color="inverse", # Vermelho se subir (ruim para custos), verde se cair
-                    help=f"Vs. Mês Anterior ({selected_months[-2]}): {format_kpi_value(penultimo_mes_valor)}")
-    else:
-        # Caso só um mês seja selecionado
-        ultimo_mes_valor = data_categoria.iloc[-1]
-        kpi4.metric(label=f"Valor em {selected_months[-1]}", value=format_kpi_value(ultimo_mes_valor))
+        # Detecção inteligente de formato (percentual vs número)
+        is_percent = '%' in categoria_selecionada or (data_categoria.abs().max() < 2 and data_categoria.abs().max() != 0)
+
+        def format_kpi_value(value):
+            if is_percent: return f"{value:.2%}"
+            return f"{value:,.2f}"
+
+        # --- MÉTRICAS COM O NOVO KPI DE "ÚLTIMO MÊS" ---
+        st.subheader("Métricas no Período Selecionado")
+        kpi1, kpi2, kpi3, kpi4 = st.columns(4) # Adicionada uma quarta coluna
+
+        kpi1.metric(label="Média", value=format_kpi_value(data_categoria.mean()))
+        kpi2.metric(label=f"Mínimo (em {data_categoria.idxmin()})", value=format_kpi_value(data_categoria.min()))
+        kpi3.metric(label=f"Máximo (em {data_categoria.idxmax()})", value=format_kpi_value(data_categoria.max()))
+
+        # Lógica para o KPI "Último Mês vs Mês Anterior"
+        if len(selected_months) >= 2:
+            ultimo_mes_valor = data_categoria.iloc[-1]
+            penultimo_mes_valor = data_categoria.iloc[-2]
+            delta = ultimo_mes_valor - penultimo_mes_valor
+            kpi4.metric(label=f"Último Mês ({selected_months[-1]})",
+                        value=format_kpi_value(ultimo_mes_valor),
+                        delta=format_kpi_value(delta),
+                        delta_color="inverse", # Vermelho se subir (ruim para custos), verde se cair
+                        help=f"Vs. Mês Anterior ({selected_months[-2]}): {format_kpi_value(penultimo_mes_valor)}")
+        else:
+            # Caso só um mês seja selecionado
+            ultimo_mes_valor = data_categoria.iloc[-1]
+            kpi4.metric(label=f"Valor em {selected_months[-1]}", value=format_kpi_value(ultimo_mes_valor))
     
-    # --- GRÁFICO E TABELA (sem alterações) ---
-    st.subheader("Evolução Mensal")
-    fig_line = px.line(data_categoria,
-                         title=f"Evolução de '{categoria_selecionada}'",
-                         labels={'x': 'Mês', 'y': 'Valor'},
-                         markers=True, text=data_categoria.apply(format_kpi_value))
-    fig_line.update_traces(line=dict(color='royalblue', width=3))
-    st.plotly_chart(fig_line, use_container_width=True)
-
-    st.subheader("Dados Detalhados")
-    st.dataframe(data_categoria.to_frame(name='Valor').style.format(format_kpi_value))
-
-else:
-    st.info("Selecione uma categoria para visualizar a análise.")
\ No newline at end of file
+        # --- GRÁFICO E TABELA ---
+        # Os valores são formatados uma vez e reaproveitados no gráfico e na tabela (sem Styler)
+        valores_formatados = data_categoria.map(format_kpi_value)
+        st.subheader("Evolução Mensal")
+
+        def construir():
+            fig_line = px.line(data_categoria,
+                                 title=f"Evolução de '{categoria_selecionada}'",
+                                 labels={'x': 'Mês', 'y': 'Valor'},
+                                 markers=True, text=valores_formatados,
+                                 render_mode=modo_renderizacao(len(data_categoria)))
+            fig_line.update_traces(line=dict(color='royalblue', width=3))
+            return fig_line
+
+        chave_figura = (st.session_state.dataset.chave, st.session_state.unidade, 'evolucao', categoria_selecionada, start_month_idx, end_month_idx)
+        fig_line = FIGURAS.obter(chave_figura, construir)
+        with secao("plotly_chart"):
+            st.plotly_chart(fig_line, use_container_width=True)
+
+        st.subheader("Dados Detalhados")
+        with secao("tabela"):
+            st.dataframe(valores_formatados.to_frame(name='Valor'))
+
+        # --- COMPARATIVO ANO A ANO (HISTÓRICO LOCAL) ---
+        # O histórico guarda todos os datasets já carregados; a consulta lê só a
+        # conta selecionada, nos anos escolhidos, sem carregar as planilhas antigas.
+        posicao = start_idx + df_grupo.index.tolist().index(categoria_selecionada)
+        unidades_hist, agregacao = unidades_da_visao(st.session_state.unidade, st.session_state.dataset.df)
+        try:
+            with secao("historico"):
+                anos = sorted({m // 12 for m in HISTORICO.meses(unidades_hist)})
+        except sqlite3.Error:
+            anos = []
+        if len(anos) > 1:
+            st.subheader("📅 Comparativo Ano a Ano")
+            st.caption("Inclui os anos de planilhas carregadas anteriormente nesta instalação.")
+            ano_inicio, ano_fim = st.select_slider("Anos", options=anos, value=(max(anos[0], anos[-1] - 2), anos[-1]), key="historico_anos")
+            with secao("historico"):
+                anual = HISTORICO.comparativo_anual(unidades_hist, (posicao, posicao), ano_inicio * 12, ano_fim * 12 + 11, agregacao)
+
+            fig_anual = px.line(anual, x='mes_do_ano', y='valor', color=anual['ano'].astype(str), markers=True,
+                                labels={'mes_do_ano': 'Mês do Ano', 'valor': 'Valor', 'color': 'Ano'})
+            fig_anual.update_xaxes(dtick=1)
+            with secao("plotly_chart"):
+                st.plotly_chart(fig_anual, use_container_width=True)
+
+            recentes = anual.dropna(subset=['valor']).tail(12)
+            st.dataframe(pd.DataFrame({
+                'Valor': recentes['valor'].map(format_kpi_value).to_numpy(),
+                'Ano Anterior': recentes['valor_ano_anterior'].map(lambda v: "-" if pd.isna(v) else format_kpi_value(v)).to_numpy(),
+                'Variação': recentes['variacao'].map(lambda v: "-" if pd.isna(v) else f"{v:+.1%}").to_numpy(),
+            }, index=recentes['mes']))
+
+    else:
+        st.info("Selecione uma categoria para visualizar a análise.")
@@ -1,8 +1,10 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
 import plotly.express as px
-from sklearn.linear_model import LinearRegression
+from core.diagnostico import CRITERIOS, formatar_criterio, pontos_de_atencao
+from core.graficos import FIGURAS, modo_renderizacao
+from core.previsao import rotulos_futuros
+from core.instrumentacao import secao
+from core.ui import finalizar_metricas, medir_fragmento, medir_pagina, mostrar_progresso_precalculo, selecionar_unidade
 # import openai  # <-- REMOVIDO
 
 # --- CONFIGURAÇÃO DA PÁGINA ---
@@ -10,104 +12,177 @@ st.set_page_config(layout="wide")
 st.title("💡 Análise e Recomendações")
 st.markdown("Use esta página para encontrar problemas automaticamente ou para fazer uma análise profunda de uma categoria específica.")
 
-if 'df' not in st.session_state:
+if st.session_state.get('dataset') is None:
     st.error("Por favor, faça o upload de um arquivo na página principal primeiro.")
     st.stop()
 
-# --- FUNÇÃO DA IA FOI DESATIVADA ---
-# @st.cache_data
-# def get_ia_tips(categoria, tipo_problema, grupo, valor_delta_str):
-#     # O código original da IA estava aqui.
-#     # Como foi desativado, retornamos uma mensagem padrão.
-#     return "Funcionalidade de IA temporariamente desativada."
-
-# --- CARREGAMENTO DE DADOS E FILTROS ---
-df, months, grupos = st.session_state.df, st.session_state.months, st.session_state.grupos
-with st.sidebar:
-    st.header("Filtros de Análise")
-    grupo_analise = st.selectbox("1. Selecione um Grupo", list(grupos.keys()), index=3)
-    start_month, end_month = st.select_slider("2. Selecione o Período", options=months, value=(months[0], months[-1]), key="analise_periodo_slider")
-
-start_idx, end_idx = months.index(start_month), months.index(end_month)
-df_periodo = df.iloc[:, start_idx:end_idx + 1]
-start_g, end_g = grupos[grupo_analise]
-df_grupo = df_periodo.iloc[start_g:min(end_g + 1, len(df))]
-
-if df_grupo.shape[1] < 2:
-    st.warning("Selecione um período com pelo menos 2 meses para realizar as análises.")
-    st.stop()
+with medir_pagina("💡 Análise e Recomendações"):
+    with secao("selecionar_unidade"):
+        selecionar_unidade()
+    mostrar_progresso_precalculo()
+
+    # --- FUNÇÃO DA IA FOI DESATIVADA ---
+    # @st.cache_data
+    # def get_ia_tips(categoria, tipo_problema, grupo, valor_delta_str):
+    #     # O código original da IA estava aqui.
+    #     # Como foi desativado, retornamos uma mensagem padrão.
+    #     return "Funcionalidade de IA temporariamente desativada."
+
+    # --- CARREGAMENTO DE DADOS E FILTROS ---
+    df, months, grupos = st.session_state.df, st.session_state.months, st.session_state.grupos
+    with st.sidebar:
+        st.header("Filtros de Análise")
+        grupo_analise = st.selectbox("1. Selecione um Grupo", list(grupos.keys()), index=3)
+        start_month, end_month = st.select_slider("2. Selecione o Período", options=months, value=(months[0], months[-1]), key="analise_periodo_slider")
+        horizonte = st.slider("3. Meses de Projeção", 0, 12, 3, key="analise_horizonte")
+
+    start_idx, end_idx = months.index(start_month), months.index(end_month)
+    df_periodo = df.iloc[:, start_idx:end_idx + 1]
+    start_g, end_g = grupos[grupo_analise]
+    df_grupo = df_periodo.iloc[start_g:min(end_g + 1, len(df))]
+
+    if df_grupo.shape[1] < 2:
+        st.warning("Selecione um período com pelo menos 2 meses para realizar as análises.")
+        finalizar_metricas()
+        st.stop()
+
+    # --- CÁLCULO DAS MÉTRICAS DE ANÁLISE ---
+    # Os períodos comuns já foram pré-calculados em segundo plano após o upload;
+    # os demais são calculados aqui e ficam disponíveis para as outras sessões.
+    with secao("analise_df"):
+        analise_df = st.session_state.dataset.analise(st.session_state.unidade, grupo_analise, grupos[grupo_analise], start_idx, end_idx)
+
+    # --- PROJEÇÃO (SUAVIZAÇÃO EXPONENCIAL) ---
+    # O modelo é ajustado uma vez por unidade no histórico completo; por isso a
+    # projeção só é exibida quando o período termina no último mês disponível.
+    projetar = horizonte > 0 and end_idx == len(months) - 1
+    if projetar:
+        with secao("previsao"):
+            previsoes = st.session_state.dataset.previsao(st.session_state.unidade).prever(horizonte)
+        meses_futuros = rotulos_futuros(months, horizonte)
+
+    def grafico_tendencia(categoria):
+        chave_figura = (st.session_state.dataset.chave, st.session_state.unidade, 'tendencia', grupo_analise,
+                        categoria, start_idx, end_idx, horizonte if projetar else 0)
+        return FIGURAS.obter(chave_figura, lambda: _construir_grafico_tendencia(categoria))
+
+    def _construir_grafico_tendencia(categoria):
+        historico = df_grupo.loc[categoria]
+        fig = px.line(x=historico.index, y=historico.values, markers=True, labels={'x': 'Mês', 'y': 'Valor'},
+                      render_mode=modo_renderizacao(len(historico)))
+        if projetar:
+            linha = df_grupo.index.tolist().index(categoria)
+            previsao, inferior, superior = (m.iloc[start_g + linha].tolist() for m in previsoes)
+            fig.add_scatter(x=meses_futuros + meses_futuros[::-1], y=superior + inferior[::-1], fill='toself',
+                            fillcolor='rgba(65,105,225,0.15)', line=dict(width=0), name='Intervalo 95%', hoverinfo='skip')
+            fig.add_scatter(x=[historico.index[-1]] + meses_futuros, y=[historico.iloc[-1]] + previsao,
+                            mode='lines+markers', line=dict(dash='dash', color='royalblue'), name='Projeção')
+        fig.update_layout(showlegend=False, margin=dict(l=0, r=0, t=10, b=0), height=280)
+        return fig
+
+    # --- SELETOR DE MODO ---
+    st.markdown("---")
+    # Cada modo é um fragmento: os widgets de dentro dele (critério, Top N,
+    # categoria...) reexecutam só o modo, sem refazer filtros e gráficos do resto da página.
+    modo_analise = st.radio("**Escolha o modo de análise:**", ["Diagnóstico Automático", "Análise Individual", "Anomalias (Todos os Grupos)"], horizontal=True, label_visibility="collapsed")
+
+    # ================================
+    # MODO 1: DIAGNÓSTICO AUTOMÁTICO
+    # ================================
+    @st.fragment
+    @medir_fragmento("diagnostico")
+    def modo_diagnostico_automatico():
+        st.header(f"Diagnóstico Automático: {grupo_analise}")
+        criterio = st.selectbox("Identificar pontos de atenção por:", list(CRITERIOS))
+        top_n = st.slider("Analisar o Top N", 3, 10, 5)
+
+        categorias_problema = pontos_de_atencao(analise_df, criterio, top_n)
+
+        for categoria, dados in categorias_problema.iterrows():
+            with st.container(border=True):
+                col_diag, col_chart = st.columns([0.6, 0.4])
+                with col_diag:
+                    st.subheader(f"🚨 {categoria}")
+                    valor_delta_str = formatar_criterio(dados, criterio)
+                    st.metric(label=criterio, value=valor_delta_str, delta_color="off")
+                    with st.expander("**Obter Sugestões**"): # MUDOU O TEXTO
+                         st.info("Funcionalidade de sugestão com IA temporariamente desativada.") # MUDOU O CONTEÚDO
+
+                with col_chart:
+                     st.markdown("##### Tendência e Projeção")
+                     with secao("plotly_chart"):
+                         st.plotly_chart(grafico_tendencia(categoria), use_container_width=True, key=f"tendencia_{categoria}")
+
+    # ================================
+    # MODO 3: ANOMALIAS EM TODOS OS GRUPOS
+    # ================================
+    @st.fragment
+    @medir_fragmento("anomalias")
+    def modo_anomalias():
+        st.header("Anomalias: todas as contas de todos os grupos")
+        st.markdown(f"Avalia o último mês do período ({end_month}) contra o histórico de cada conta e ranqueia as contas mais atípicas.")
+        col_opt1, col_opt2 = st.columns(2)
+        with col_opt1:
+            top_n = st.slider("Mostrar o Top N", 5, 50, 15, key="anomalias_top_n")
+        with col_opt2:
+            todas_unidades = len(st.session_state.dataset.unidades) > 1 and st.checkbox("Incluir todas as unidades", value=False)
+
+        # O ranking fica no registro compartilhado: mudar só o Top N não recalcula as anomalias
+        with secao("detectar_anomalias"):
+            anomalias = st.session_state.dataset.anomalias(st.session_state.unidade, todas_unidades, start_idx, end_idx, grupos)
+        piores = anomalias.head(top_n)
+        if todas_unidades:
+            piores.index = [f"{u} · {c}" for u, c in piores.index]
+
+        st.dataframe(
+            piores,
+            column_config={
+                'grupo': "Grupo",
+                'ultimo_valor': st.column_config.NumberColumn("Último Valor", format="%.2f"),
+                'z_movel': st.column_config.NumberColumn("z (média móvel)", format="%.2f"),
+                'z_robusto': st.column_config.NumberColumn("z robusto (MAD)", format="%.2f"),
+                'variacao_mensal': st.column_config.NumberColumn("Variação Mensal", format="percent"),
+                'quebra_tendencia': st.column_config.NumberColumn("Quebra de Tendência", format="%.2f"),
+                'pontuacao': st.column_config.ProgressColumn("Pontuação", format="%.2f", min_value=0, max_value=max(float(piores['pontuacao'].max()), 1.0)),
+                'motivo': "Principal Motivo",
+            },
+            use_container_width=True
+        )
+        st.caption("Pontuação acima de 1 indica que pelo menos um critério passou do seu limiar.")
+
+    # ================================
+    # MODO 2: ANÁLISE INDIVIDUAL
+    # ================================
+    @st.fragment
+    @medir_fragmento("analise_individual")
+    def modo_analise_individual():
+        st.header(f"Análise Individual: {grupo_analise}")
+        categoria_selecionada = st.selectbox("Selecione uma Categoria para um mergulho profundo:", options=df_grupo.index)
+
+        if categoria_selecionada:
+            st.markdown("---")
+            dados_cat = analise_df.loc[categoria_selecionada]
+            with st.container(border=True):
+                col_info, col_chart = st.columns([0.6, 0.4])
+                with col_info:
+                    st.subheader(f"🔍 Análise Profunda de: {categoria_selecionada}")
+                    kpi1, kpi2 = st.columns(2)
+                    kpi1.metric("Último Valor", f"{dados_cat['ultimo_valor']:,.2f}")
+                    kpi2.metric("Média Histórica", f"{dados_cat['media_historica']:,.2f}")
+                    st.metric("Variação (Último vs. Média)", f"{dados_cat['desempenho_recente']:,.2f}", delta_color="inverse")
+                    st.metric("Tendência (Crescimento/Mês)", f"{dados_cat['tendencia_linear']:.2f}", help="Positivo significa crescimento.")
+                    with st.expander("**Obter Sugestões**"): # MUDOU O TEXTO
+                        st.info("Funcionalidade de sugestão com IA temporariamente desativada.") # MUDOU O CONTEÚDO
+                with col_chart:
+                    st.subheader("📈 Gráfico de Evolução")
+                    with secao("plotly_chart"):
+                        st.plotly_chart(grafico_tendencia(categoria_selecionada), use_container_width=True)
+                    if horizonte > 0 and not projetar:
+                        st.caption("A projeção é exibida quando o período termina no último mês disponível.")
 
-# --- CÁLCULO DAS MÉTRICAS DE ANÁLISE ---
-def calcular_tendencia(row):
-    valid_data = row.dropna()
-    if len(valid_data) < 2: return 0.0
-    X = np.arange(len(valid_data)).reshape(-1, 1)
-    y = valid_data.values
-    model = LinearRegression().fit(X, y)
-    return model.coef_[0]
-
-analise_df = pd.DataFrame(index=df_grupo.index)
-analise_df['ultimo_valor'] = df_grupo.iloc[:, -1]
-analise_df['media_historica'] = df_grupo.iloc[:, :-1].mean(axis=1)
-analise_df['desempenho_recente'] = analise_df['ultimo_valor'] - analise_df['media_historica']
-analise_df['volatilidade'] = df_grupo.std(axis=1)
-analise_df['tendencia_linear'] = df_grupo.apply(calcular_tendencia, axis=1)
-analise_df.fillna(0, inplace=True)
-
-# --- SELETOR DE MODO ---
-st.markdown("---")
-modo_analise = st.radio("**Escolha o modo de análise:**", ["Diagnóstico Automático", "Análise Individual"], horizontal=True, label_visibility="collapsed")
-
-# ================================
-# MODO 1: DIAGNÓSTICO AUTOMÁTICO
-# ================================
-if modo_analise == "Diagnóstico Automático":
-    st.header(f"Diagnóstico Automático: {grupo_analise}")
-    criterio = st.selectbox("Identificar pontos de atenção por:", ["Pior Tendência (Crescimento)", "Pior Desempenho Recente", "Maior Volatilidade"])
-    top_n = st.slider("Analisar o Top N", 3, 10, 5)
-
-    mapa = {"Pior Tendência (Crescimento)": "tendencia_linear", "Pior Desempenho Recente": "desempenho_recente", "Maior Volatilidade": "volatilidade"}
-    # Corrigido para garantir que a ordenação seja correta para "Pior Tendência" (menor valor é pior)
-    ascending_map = {"Pior Tendência (Crescimento)": True, "Pior Desempenho Recente": True, "Maior Volatilidade": False}
-    categorias_problema = analise_df.sort_values(by=mapa[criterio], ascending=ascending_map[criterio]).head(top_n)
-
-    for categoria, dados in categorias_problema.iterrows():
-        with st.container(border=True):
-            col_diag, col_chart = st.columns([0.6, 0.4])
-            with col_diag:
-                st.subheader(f"🚨 {categoria}")
-                if criterio == "Pior Tendência (Crescimento)": valor_delta_str = f"{dados['tendencia_linear']:.2f}/mês"
-                elif criterio == "Pior Desempenho Recente": valor_delta_str = f"{dados['desempenho_recente']:,.2f}"
-                else: valor_delta_str = f"{dados['volatilidade']:,.2f}"
-                st.metric(label=criterio, value=valor_delta_str, delta_color="off")
-                with st.expander("**Obter Sugestões**"): # MUDOU O TEXTO
-                     st.info("Funcionalidade de sugestão com IA temporariamente desativada.") # MUDOU O CONTEÚDO
-
-            with col_chart:
-                 st.markdown("##### Tendência e Projeção")
-                 st.line_chart(df_grupo.loc[categoria])
-
-# ================================
-# MODO 2: ANÁLISE INDIVIDUAL
-# ================================
-else:
-    st.header(f"Análise Individual: {grupo_analise}")
-    categoria_selecionada = st.selectbox("Selecione uma Categoria para um mergulho profundo:", options=df_grupo.index)
-
-    if categoria_selecionada:
-        st.markdown("---")
-        dados_cat = analise_df.loc[categoria_selecionada]
-        with st.container(border=True):
-            col_info, col_chart = st.columns([0.6, 0.4])
-            with col_info:
-                st.subheader(f"🔍 Análise Profunda de: {categoria_selecionada}")
-                kpi1, kpi2 = st.columns(2)
-                kpi1.metric("Último Valor", f"{dados_cat['ultimo_valor']:,.2f}")
-                kpi2.metric("Média Histórica", f"{dados_cat['media_historica']:,.2f}")
-                st.metric("Variação (Último vs. Média)", f"{dados_cat['desempenho_recente']:,.2f}", delta_color="inverse")
-                st.metric("Tendência (Crescimento/Mês)", f"{dados_cat['tendencia_linear']:.2f}", help="Positivo significa crescimento.")
-                with st.expander("**Obter Sugestões**"): # MUDOU O TEXTO
-                    st.info("Funcionalidade de sugestão com IA temporariamente desativada.") # MUDOU O CONTEÚDO
-            with col_chart:
-                st.subheader("📈 Gráfico de Evolução")
-                st.line_chart(df_grupo.loc[categoria_selecionada])
\ No newline at end of file
+    if modo_analise == "Diagnóstico Automático":
+        modo_diagnostico_automatico()
+    elif modo_analise == "Anomalias (Todos os Grupos)":
+        modo_anomalias()
+    else:
+        modo_analise_individual()
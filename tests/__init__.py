@@ -0,0 +1,2 @@
+# tests/__init__.py
+# Verificações de equivalência dos cálculos vetorizados: python -m unittest (ou pytest)
@@ -0,0 +1,86 @@
+# tests/test_consolidacao.py
+
+import tempfile
+import unittest
+from io import BytesIO
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+from core import cache_disco
+from core.consolidacao import (CONSOLIDADO_SOMA, arquivos_por_unidade, carregar_varias, consolidar,
+                               juntar_planilhas, opcoes_unidade)
+
+CONTAS = ["Receita", "CMV", "Despesas"]
+
+
+def _planilha(meses, base):
+    wb = Workbook()
+    wb.active.append(["Conta"] + meses)
+    for i, conta in enumerate(CONTAS):
+        wb.active.append([conta] + [base + 10 * i + j for j in range(len(meses))])
+    conteudo = BytesIO()
+    wb.save(conteudo)
+    return conteudo.getvalue()
+
+
+class TestArquivosPorUnidade(unittest.TestCase):
+
+    def test_sufixos_unicos(self):
+        arquivos = [(f"{pasta}/Loja.xlsx", pasta.encode()) for pasta in "abcd"] + [("e/Loja (2).xlsx", b"e")]
+        unidades = [u for u, _ in arquivos_por_unidade(arquivos)]
+        self.assertEqual(unidades, ["Loja", "Loja (2)", "Loja (3)", "Loja (4)", "Loja (2) (2)"])
+        self.assertEqual(len(set(unidades)), len(arquivos))
+
+    def test_nomes_informados_repetidos_sao_a_mesma_unidade(self):
+        arquivos = [("Loja 2023.xlsx", b"a"), ("Loja 2024.xlsx", b"b")]
+        self.assertEqual(arquivos_por_unidade(arquivos, ["Loja", "Loja"]), [("Loja", b"a"), ("Loja", b"b")])
+
+
+class TestJuntarPlanilhas(unittest.TestCase):
+    """Planilhas de anos diferentes da mesma unidade viram uma unidade só."""
+
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        patcher = mock.patch.object(cache_disco, 'CACHE_DIR', pasta.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_anos_da_mesma_unidade(self):
+        # Arquivos fora de ordem: o 2024 chega antes do 2023
+        arquivos = [("Loja", _planilha(["2024-01", "2024-02"], 100)),
+                    ("Loja", _planilha(["2023-11", "2023-12"], 0)),
+                    ("Outra", _planilha(["2023-12", "2024-01"], 500))]
+        dfs = carregar_varias(arquivos, max_workers=1)
+        self.assertEqual(list(dfs), ["Loja", "Outra"])
+        self.assertEqual(list(dfs["Loja"].columns), ["2023-11", "2023-12", "2024-01", "2024-02"])
+        self.assertEqual(dfs["Loja"].loc["CMV"].tolist(), [10.0, 11.0, 110.0, 111.0])
+
+        # Com os anos juntos há meses em comum, então os consolidados aparecem e somam
+        df = consolidar(dfs)
+        self.assertIn(CONSOLIDADO_SOMA, opcoes_unidade(df))
+
+    def test_mes_repetido_fica_com_a_planilha_mais_recente(self):
+        antiga = pd.DataFrame({"dez/23": [1.0, 2.0, 3.0], "2024-01": [4.0, 5.0, 6.0]}, index=CONTAS)
+        nova = pd.DataFrame({"2024-01": [7.0, 8.0, 9.0], "2024-02": [0.0, 0.0, 0.0]},
+                            index=["Receita", "CMV", "Despesas"][::-1])
+        junto = juntar_planilhas([nova, antiga])
+        # O layout é o da mais recente; "2024-01" aparece uma vez só, com o valor dela
+        self.assertEqual(list(junto.index), CONTAS[::-1])
+        self.assertEqual(list(junto.columns), ["dez/23", "2024-01", "2024-02"])
+        self.assertEqual(junto["2024-01"].tolist(), [7.0, 8.0, 9.0])
+        self.assertEqual(junto["dez/23"].tolist(), [3.0, 2.0, 1.0])
+
+    def test_meses_nao_reconhecidos_ficam_na_ordem_das_planilhas(self):
+        a = pd.DataFrame({"Jan": [1.0, 2.0, 3.0]}, index=CONTAS)
+        b = pd.DataFrame({"Fev": [4.0, 5.0, 6.0]}, index=CONTAS)
+        junto = juntar_planilhas([a, b])
+        self.assertEqual(list(junto.columns), ["Jan", "Fev"])
+        self.assertTrue(np.array_equal(junto.to_numpy(), [[1, 4], [2, 5], [3, 6]]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+# tests/test_dados.py
+
+import datetime
+import unittest
+from io import BytesIO
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+from core import dados
+from core.dados import converter_bloco, ler_excel
+
+
+def _planilha(linhas):
+    wb = Workbook()
+    for linha in linhas:
+        wb.active.append(linha)
+    conteudo = BytesIO()
+    wb.save(conteudo)
+    return conteudo.getvalue()
+
+
+class TestConverterBloco(unittest.TestCase):
+    """Regras de conversão das células: números, texto no formato brasileiro e o que conta como falha."""
+
+    def _converter(self, celulas):
+        valores, falhas = converter_bloco(np.array(celulas, dtype=object).reshape(1, -1))
+        return valores[0].tolist(), falhas
+
+    def test_numeros_passam_direto(self):
+        valores, falhas = self._converter([1, 2.5, np.float64(-3.25), 0])
+        self.assertEqual(valores, [1.0, 2.5, -3.25, 0.0])
+        self.assertEqual(falhas, 0)
+
+    def test_texto_brasileiro(self):
+        valores, falhas = self._converter(["1.234,56", "12,5", "-0,75", " 1.000.000,00 ", "3.5"])
+        self.assertEqual(valores, [1234.56, 12.5, -0.75, 1000000.0, 3.5])
+        self.assertEqual(falhas, 0)
+
+    def test_vazios_nao_sao_falha(self):
+        valores, falhas = self._converter([None, "", "   ", np.nan])
+        self.assertTrue(np.isnan(valores).all())
+        self.assertEqual(falhas, 0)
+
+    def test_booleanos_e_texto_sao_falha(self):
+        valores, falhas = self._converter([True, False, np.bool_(True), "abc", "1,2,3", 1, 0])
+        self.assertTrue(np.isnan(valores[:5]).all())
+        self.assertEqual(valores[5:], [1.0, 0.0])
+        self.assertEqual(falhas, 5)
+
+
+class TestLerExcel(unittest.TestCase):
+    """A leitura em streaming deve gerar os mesmos rótulos que o pd.read_excel."""
+
+    CABECALHO = ["Conta", datetime.datetime(2024, 1, 1), None, "Jan", "Jan", "Jan", 2024, "Total"]
+
+    def test_rotulos_iguais_ao_read_excel(self):
+        conteudo = _planilha([
+            self.CABECALHO,
+            ["Receita", "1.234,56", "12,5", 1, 2, 3, 4, 5],
+            [101, 1, 2, 3, 4, 5, 6, 7],
+            ["CMV %", 0.25, None, 0.5, 0.5, 0.5, 0.5, 0.5],
+        ])
+        df = ler_excel(conteudo)
+        esperado = pd.read_excel(BytesIO(conteudo), header=0, index_col=0)
+        self.assertEqual(list(df.columns), list(esperado.columns))
+        self.assertEqual([type(c) for c in df.columns], [type(c) for c in esperado.columns])
+        self.assertEqual(list(df.index), list(esperado.index))
+        self.assertEqual(df.index.name, esperado.index.name)
+        self.assertEqual(df.loc["Receita"].iloc[:2].tolist(), [1234.56, 12.5])
+
+    def test_falhas_somadas_entre_blocos(self):
+        linhas = [self.CABECALHO[:3]] + [[f"Conta {i}", "x" if i % 3 == 1 else i, True if i % 4 == 2 else "1,5"]
+                                         for i in range(10)]
+        with mock.patch.object(dados, 'TAMANHO_BLOCO', 3):
+            df = ler_excel(_planilha(linhas))
+        self.assertEqual(df.attrs['celulas_invalidas'], 3 + 2)
+        self.assertEqual(len(df), 10)
+        self.assertEqual(df.iloc[0].tolist(), [0.0, 1.5])
+        self.assertTrue(np.isnan(df.iloc[2, 1]))
+
+
+if __name__ == "__main__":
+    unittest.main()
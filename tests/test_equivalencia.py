@@ -0,0 +1,73 @@
+# tests/test_equivalencia.py
+
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from core.indice_periodo import IndicePeriodo
+from core.tendencia import ajustar_tendencias
+
+
+def _matriz(semente, n_linhas=40, n_meses=30, densidade_nan=0.25):
+    # Linhas com buracos, linhas vazias, com um único valor e constantes
+    rng = np.random.default_rng(semente)
+    valores = rng.normal(1000, 300, (n_linhas, n_meses)) + np.arange(n_meses) * rng.normal(0, 20, (n_linhas, 1))
+    valores[rng.random((n_linhas, n_meses)) < densidade_nan] = np.nan
+    valores[0] = np.nan
+    valores[1] = np.nan
+    valores[1, 7] = 42.0
+    valores[2] = 5.0
+    return pd.DataFrame(valores, columns=[f"m{j}" for j in range(n_meses)])
+
+
+class TestTendencia(unittest.TestCase):
+    """ajustar_tendencias deve reproduzir o ajuste por linha antigo (LinearRegression em row.dropna())."""
+
+    def test_igual_ao_ajuste_por_linha(self):
+        for semente in range(5):
+            df = _matriz(semente)
+            resultado = ajustar_tendencias(df)
+            for i, (_, linha) in enumerate(df.iterrows()):
+                y = linha.dropna().to_numpy()
+                if len(y) < 2:
+                    self.assertEqual(resultado['inclinacao'].iloc[i], 0.0)
+                    continue
+                # Mínimos quadrados com x = posição entre os válidos, como o LinearRegression fazia
+                inclinacao, intercepto = np.polyfit(np.arange(len(y)), y, 1)
+                self.assertAlmostEqual(resultado['inclinacao'].iloc[i], inclinacao, delta=1e-9 * max(1.0, abs(inclinacao)))
+                self.assertAlmostEqual(resultado['intercepto'].iloc[i], intercepto, delta=1e-9 * max(1.0, abs(intercepto)))
+                self.assertEqual(resultado['n'].iloc[i], len(y))
+
+
+class TestIndicePeriodo(unittest.TestCase):
+    """As consultas do índice devem bater com o pandas, e anexar() com a reconstrução completa."""
+
+    def _comparar(self, obtido, esperado):
+        np.testing.assert_allclose(obtido.to_numpy(dtype=float), esperado.to_numpy(dtype=float), rtol=1e-9, atol=1e-9, equal_nan=True)
+
+    def test_igual_ao_pandas(self):
+        df = _matriz(7)
+        indice = IndicePeriodo(df)
+        for inicio in range(0, df.shape[1], 3):
+            for fim in range(inicio, df.shape[1], 4):
+                fatia = df.iloc[:, inicio:fim + 1]
+                stats = indice.estatisticas(inicio, fim)
+                self._comparar(stats['media'], fatia.mean(axis=1))
+                self._comparar(stats['desvio'], fatia.std(axis=1))
+                self._comparar(stats['minimo'], fatia.min(axis=1))
+                self._comparar(stats['maximo'], fatia.max(axis=1))
+                self._comparar(stats['contagem'], fatia.count(axis=1))
+
+    def test_anexar_igual_a_reconstruir(self):
+        df = _matriz(11, n_meses=37)
+        for corte in (1, 16, 30, 36):
+            anexado = IndicePeriodo(df.iloc[:, :corte]).anexar(df.iloc[:, corte:])
+            completo = IndicePeriodo(df)
+            for inicio in range(df.shape[1]):
+                for fim in range(inicio, df.shape[1], 5):
+                    self._comparar(anexado.estatisticas(inicio, fim), completo.estatisticas(inicio, fim))
+
+
+if __name__ == "__main__":
+    unittest.main()
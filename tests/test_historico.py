@@ -0,0 +1,135 @@
+# tests/test_historico.py
+
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from core.consolidacao import consolidar
+from core.historico import HistoricoLocal, rotulo_mes
+from core.texto import mes_absoluto
+
+CONTAS = ["Receita", "CMV", "Despesas"]
+
+
+def _dataset(meses, base, contas=CONTAS, **unidades):
+    """Dataset consolidado com as `unidades` (nome=deslocamento); célula = base + deslocamento + 10 * linha + coluna."""
+    dfs = {u: pd.DataFrame([[base + d + 10 * i + j for j in range(len(meses))] for i in range(len(contas))],
+                           index=contas, columns=meses, dtype=float)
+           for u, d in (unidades or {'A': 0}).items()}
+    return consolidar(dfs)
+
+
+def _meses(inicio, n):
+    primeiro = mes_absoluto(inicio)
+    return [rotulo_mes(m) for m in range(primeiro, primeiro + n)]
+
+
+class TestGravar(unittest.TestCase):
+    """Regra de atualização do histórico: fica o dataset que vai até o mês mais recente."""
+
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.caminho = os.path.join(pasta.name, "historico.sqlite")
+        self.historico = HistoricoLocal(self.caminho)
+
+    def test_planilha_antiga_nao_sobrescreve_a_nova(self):
+        self.assertEqual(self.historico.gravar(_dataset(_meses("2024-01", 6), 1000), "nova"), [])
+        antiga = _dataset(_meses("2023-07", 9), 0, contas=["Receita antiga", "CMV", "Despesas"])
+        self.assertEqual(self.historico.gravar(antiga, "antiga"), [])
+
+        serie = self.historico.serie(['A'])
+        self.assertEqual(list(serie.columns), _meses("2023-07", 12))
+        # Os meses de 2024 continuam com os valores (e o rótulo) da planilha nova
+        self.assertEqual(serie.loc["Receita", "2024-01"], 1000.0)
+        self.assertEqual(serie.loc["CMV", "2024-03"], 1012.0)
+        # Os meses que só a antiga tinha entram no histórico
+        self.assertEqual(serie.loc["Receita", "2023-07"], 0.0)
+        self.assertNotIn("Receita antiga", serie.index)
+
+    def test_mesmo_fim_a_ultima_gravacao_vence(self):
+        self.historico.gravar(_dataset(_meses("2024-01", 3), 0), "primeira")
+        self.historico.gravar(_dataset(_meses("2024-02", 2), 500, contas=["Receita líquida", "CMV", "Despesas"]),
+                              "segunda")
+        serie = self.historico.serie(['A'])
+        self.assertEqual(serie.iloc[0].tolist(), [0.0, 500.0, 501.0])
+        self.assertEqual(serie.index[0], "Receita líquida")
+
+    def test_mesma_chave_nao_e_regravada(self):
+        self.historico.gravar(_dataset(_meses("2024-01", 2), 0), "chave")
+        self.historico.gravar(_dataset(_meses("2024-01", 2), 900), "chave")
+        self.assertEqual(self.historico.serie(['A']).iloc[0].tolist(), [0.0, 1.0])
+
+    def test_celulas_vazias_e_rotulos_nao_reconhecidos(self):
+        df = _dataset(["2024-01", "Jan", "Total"], 0)
+        df.iloc[0, 0] = np.nan
+        self.assertEqual(self.historico.gravar(df, "parcial"), ["Jan", "Total"])
+        serie = self.historico.serie(['A'])
+        self.assertEqual(list(serie.columns), ["2024-01"])
+        self.assertEqual(serie["2024-01"].tolist(), [10.0, 20.0])
+
+        # Sem nenhum mês reconhecível, nada é gravado
+        self.assertEqual(self.historico.gravar(_dataset(["Jan", "Fev"], 0, B=0), "sem ano"), ["Jan", "Fev"])
+        self.assertEqual(self.historico.meses(['B']), [])
+
+    def test_migra_historico_sem_coluna_ate(self):
+        with sqlite3.connect(self.caminho) as conexao:
+            conexao.executescript("""
+                CREATE TABLE datasets (chave TEXT PRIMARY KEY, nome TEXT, gravado_em REAL);
+                CREATE TABLE contas (unidade TEXT NOT NULL, posicao INTEGER NOT NULL, conta TEXT,
+                                     PRIMARY KEY (unidade, posicao)) WITHOUT ROWID;
+                CREATE TABLE valores (unidade TEXT NOT NULL, posicao INTEGER NOT NULL, mes INTEGER NOT NULL,
+                                      valor REAL, PRIMARY KEY (unidade, posicao, mes)) WITHOUT ROWID;
+            """)
+            conexao.execute("INSERT INTO contas VALUES ('A', 0, 'Receita velha')")
+            conexao.execute("INSERT INTO valores VALUES ('A', 0, ?, -1)", (mes_absoluto("2024-01"),))
+        conexao.close()
+
+        # As linhas antigas ficam com ate = 0 e qualquer gravação nova as atualiza
+        self.assertEqual(self.historico.gravar(_dataset(_meses("2023-12", 2), 0), "nova"), [])
+        serie = self.historico.serie(['A'])
+        self.assertEqual(serie.index[0], "Receita")
+        self.assertEqual(serie.iloc[0].tolist(), [0.0, 1.0])
+
+
+class TestComparativoAnual(unittest.TestCase):
+
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.historico = HistoricoLocal(os.path.join(pasta.name, "historico.sqlite"))
+        # 2023-01..2024-03 para A e B; B vale 100 a mais que A
+        self.historico.gravar(_dataset(_meses("2023-01", 15), 100, A=0, B=100), "dados")
+
+    def test_mes_contra_o_mesmo_mes_do_ano_anterior(self):
+        comparativo = self.historico.comparativo_anual(['A'], faixa=(0, 0), inicio=mes_absoluto("2024-01"))
+        self.assertEqual(comparativo['mes'].tolist(), ["2024-01", "2024-02", "2024-03"])
+        self.assertEqual(comparativo['conta'].unique().tolist(), ["Receita"])
+        self.assertEqual(comparativo['ano'].tolist(), [2024] * 3)
+        self.assertEqual(comparativo['mes_do_ano'].tolist(), [1, 2, 3])
+        self.assertEqual(comparativo['valor'].tolist(), [112.0, 113.0, 114.0])
+        self.assertEqual(comparativo['valor_ano_anterior'].tolist(), [100.0, 101.0, 102.0])
+        np.testing.assert_allclose(comparativo['variacao'], [12 / 100, 12 / 101, 12 / 102])
+
+    def test_sem_ano_anterior_e_soma_das_unidades(self):
+        comparativo = self.historico.comparativo_anual(['A', 'B'], faixa=(1, 1))
+        self.assertEqual(len(comparativo), 15)
+        primeiro = comparativo.iloc[0]
+        self.assertEqual((primeiro['mes'], primeiro['conta'], primeiro['valor']), ("2023-01", "CMV", 2 * 110.0 + 100))
+        self.assertTrue(np.isnan(primeiro['valor_ano_anterior']) and np.isnan(primeiro['variacao']))
+        ultimo = comparativo.iloc[-1]
+        self.assertEqual((ultimo['valor'], ultimo['valor_ano_anterior']), (2 * 124.0 + 100, 2 * 112.0 + 100))
+
+    def test_ano_anterior_zerado_nao_tem_variacao(self):
+        self.historico.gravar(_dataset(["2022-01", "2023-01"], 0, C=0).mul(0), "zerado")
+        comparativo = self.historico.comparativo_anual(['C'], faixa=(0, 0))
+        self.assertEqual(comparativo['valor_ano_anterior'].tolist()[1], 0.0)
+        self.assertTrue(np.isnan(comparativo['variacao'].iloc[1]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+# tests/test_registro.py
+
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from core.consolidacao import CONSOLIDADO_MEDIA, CONSOLIDADO_SOMA, consolidar
+from core.registro import RegistroDatasets
+
+CONTAS = [f"Conta {i}" for i in range(6)]
+
+
+def _unidade(semente, meses):
+    rng = np.random.default_rng(semente)
+    return pd.DataFrame(rng.uniform(0, 1000, (len(CONTAS), len(meses))).round(2), index=CONTAS, columns=meses)
+
+
+def _mes(coluna, valor):
+    return pd.DataFrame({coluna: np.full(len(CONTAS), valor)}, index=CONTAS)
+
+
+class TestAnexarMeses(unittest.TestCase):
+    """Fechamento mensal de várias unidades: o mesmo mês acrescentado a uma unidade de cada vez."""
+
+    def setUp(self):
+        meses = ["2015-10", "2015-11", "2015-12"]
+        self.registro = RegistroDatasets()
+        self.dataset = self.registro.registrar("base", consolidar({'A': _unidade(1, meses), 'B': _unidade(2, meses)}))
+
+    def test_mesmo_mes_em_duas_unidades(self):
+        dataset = self.dataset
+        soma_antes = dataset.visao(CONSOLIDADO_SOMA)  # visão já calculada, estendida no anexar
+        dataset = dataset.anexar_meses('A', _mes("2016-01", 10.0), "planilha-a")
+        self.assertNotIn("2016-01", dataset.visao(CONSOLIDADO_SOMA).columns)  # mês parcial fica de fora
+        so_a = dataset
+        dataset = dataset.anexar_meses('B', _mes("2016-01", 5.0), "planilha-b")
+        self.assertTrue(so_a.df.loc['B', "2016-01"].isna().all())  # o dataset anterior não muda
+
+        self.assertEqual(list(dataset.df.columns).count("2016-01"), 1)
+        self.assertEqual(dataset.visao('A')["2016-01"].tolist(), [10.0] * len(CONTAS))
+        self.assertEqual(dataset.visao('B')["2016-01"].tolist(), [5.0] * len(CONTAS))
+        soma = dataset.visao(CONSOLIDADO_SOMA)
+        self.assertEqual(list(soma.columns), list(soma_antes.columns) + ["2016-01"])
+        self.assertEqual(soma["2016-01"].tolist(), [15.0] * len(CONTAS))
+        self.assertEqual(dataset.visao(CONSOLIDADO_MEDIA)["2016-01"].tolist(), [7.5] * len(CONTAS))
+
+        with self.assertRaises(ValueError):
+            dataset.anexar_meses('B', _mes("2016-01", 1.0), "outra")
+
+    def test_chave_depende_da_unidade(self):
+        planilha = _mes("2016-01", 10.0)
+        em_a = self.dataset.anexar_meses('A', planilha, "mesma-planilha")
+        em_b = self.dataset.anexar_meses('B', planilha, "mesma-planilha")
+        self.assertNotEqual(em_a.chave, em_b.chave)
+        self.assertEqual(em_b.visao('B')["2016-01"].tolist(), [10.0] * len(CONTAS))
+        self.assertNotIn("2016-01", em_b.visao('A').columns)
+
+    def test_consolidado_sem_meses_em_comum(self):
+        registro = RegistroDatasets()
+        dataset = registro.registrar("disjuntos", consolidar({'A': _unidade(1, ["2015-01"]), 'B': _unidade(2, ["2016-01"])}))
+        self.assertEqual(dataset.unidades, ['A', 'B'])
+
+
+if __name__ == "__main__":
+    unittest.main()